@@ -37,7 +37,7 @@ class PageTagFeed(Feed):
         else:
             objs = []
             tagged_objs = ModelTaggedItemManager().with_all(tags, BaseContent.objects.all())
-            for obj in tagged_objs:
-                if obj.get_content_object() in paths_objs:
-                    objs.append(obj.get_content_object())
+            for obj in tagged_objs.get_content_objects():
+                if obj in paths_objs:
+                    objs.append(obj)
             return objs
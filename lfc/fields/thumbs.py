@@ -4,15 +4,31 @@
 # python imports
 from PIL import Image
 import cStringIO
+import hashlib
+import multiprocessing
+import re
+import threading
 
 # django imports
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
 from django.core.files.base import ContentFile
+from django.core.files.base import File
+from django.core.urlresolvers import reverse
 from django.db.models import ImageField
 from django.db.models.fields.files import ImageFieldFile
 
 # lfs imports
 from lfc.utils.images import scale_to_max_size
 
+# The worker pool of the current process, see get_thumbnail_pool
+_pool = None
+_pool_lock = threading.Lock()
+
+# The pending jobs of the current thread, see wait_for_thumbnails
+_pending = threading.local()
+
 
 def generate_thumb(img, thumb_size, format):
     """
@@ -27,70 +43,272 @@ def generate_thumb(img, thumb_size, format):
     format      format of the original image ('jpeg','gif','png',...)
                 (this format will be used for the generated thumbnail, too)
     """
+    for size, content in generate_thumbs(img, [thumb_size], format):
+        return ContentFile(content.read())
+
+
+def generate_thumbs(img, sizes, format):
+    """
+    Generates thumbnail images of all passed sizes and yields tuples of size
+    and File object with the thumbnail, starting with the largest size.
+
+    The original is decoded only once. JPEGs are decoded in draft mode, i.e.
+    already downscaled by the decoder to the smallest scale which is still
+    bigger than the largest thumbnail. Every further thumbnail is scaled down
+    from the smallest thumbnail generated so far which contains it, not from
+    the original.
+
+    Parameters:
+    ===========
+    img         File object
+
+    sizes       desired thumbnail sizes, ie: ((200,120), (60,60))
+
+    format      format of the original image ('jpeg','gif','png',...)
+                (this format will be used for the generated thumbnails, too)
+    """
+    sizes = sorted(sizes, key=lambda size: size[0] * size[1], reverse=True)
+    if not sizes:
+        return
+
     img.seek(0)  # see http://code.djangoproject.com/ticket/8222 for details
     image = Image.open(img)
 
+    # Let the decoder downscale, as long as the largest thumbnail still fits
+    if image.format == 'JPEG':
+        width, height = _get_scaled_size(image.size, sizes[0])
+        if width < image.size[0] and height < image.size[1]:
+            image.draft('RGB', (width, height))
+
     # Convert to RGB if necessary
     if image.mode not in ('L', 'RGB'):
         image = image.convert('RGB')
 
-    new_image = scale_to_max_size(image, *thumb_size)
-
-    io = cStringIO.StringIO()
-
     # PNG and GIF are the same, JPG is JPEG
     if format.upper() == 'JPG':
         format = 'JPEG'
 
-    new_image.save(io, format)
-    return ContentFile(io.getvalue())
+    # The downscaled thumbnails, which can be the source of smaller ones
+    sources = []
+    for size in sizes:
+        source = image
+        for box, thumb in reversed(sources):
+            if box[0] >= size[0] and box[1] >= size[1]:
+                source = thumb
+                break
 
+        new_image = scale_to_max_size(source, *size)
+        if new_image.size[0] <= image.size[0] and new_image.size[1] <= image.size[1]:
+            sources.append((size, new_image))
 
-class ImageWithThumbsFieldFile(ImageFieldFile):
+        io = cStringIO.StringIO()
+        new_image.save(io, format)
+        io.seek(0)
+        yield size, File(io)
+
+
+def _get_scaled_size(image_size, thumb_size):
     """
-    See ImageWithThumbsField for usage example
+    Returns the size of passed image size scaled to fit into passed thumbnail
+    size, see scale_to_max_size.
     """
-    def __init__(self, *args, **kwargs):
-        super(ImageWithThumbsFieldFile, self).__init__(*args, **kwargs)
-        self.sizes = self.field.sizes
+    width, height = image_size
+    prop_width = float(thumb_size[0]) / width
+    prop_height = float(thumb_size[1]) / height
 
-        if self.sizes:
-            def get_size(self, size):
-                if not self:
-                    return ''
-                else:
-                    split = self.url.rsplit('.', 1)
-                    thumb_url = '%s.%sx%s.%s' % (split[0], w, h, split[1])
-                    return thumb_url
+    if prop_height < prop_width:
+        return (int(prop_height * width), thumb_size[1])
+    else:
+        return (thumb_size[0], int(prop_width * height))
 
-            for size in self.sizes:
-                (w, h) = size
-                setattr(self, 'url_%sx%s' % (w, h), get_size(self, size))
 
-    def save(self, name, content, save=True):
-        super(ImageWithThumbsFieldFile, self).save(name, content, save)
-        if self.sizes:
-            for size in self.sizes:
-                (w, h) = size
-                split = self.name.rsplit('.', 1)
-                thumb_name = '%s.%sx%s.%s' % (split[0], w, h, split[1])
+def get_thumb_name(name, size):
+    """
+    Returns the name of the thumbnail with passed size of the image with
+    passed name, e.g. photo.125x125.jpg for photo.jpg.
+    """
+    split = name.rsplit('.', 1)
+    return '%s.%sx%s.%s' % (split[0], size[0], size[1], split[1])
+
+
+def set_thumb_stored(name, size, stored=True):
+    """
+    Records whether the thumbnail with passed size of the image with passed
+    name is stored, so that its static URL can be returned without asking
+    the storage. See ImageWithThumbsFieldFile.get_thumb_url.
+    """
+    if stored:
+        cache.set(_get_thumb_key(name, size), True, None)
+    else:
+        cache.delete(_get_thumb_key(name, size))
+
+
+def is_thumb_stored(name, size):
+    """
+    Returns True if the thumbnail with passed size of the image with passed
+    name has been recorded as stored, see set_thumb_stored.
+    """
+    return cache.get(_get_thumb_key(name, size), False)
+
+
+def _get_thumb_key(name, size):
+    """
+    Returns the cache key which records that the thumbnail is stored.
+    """
+    return "%s-thumb-%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX,
+                            hashlib.md5(get_thumb_name(name, size).encode("utf-8")).hexdigest())
 
-                # you can use another thumbnailing function if you like
-                thumb_content = generate_thumb(self.file, size, split[1])
 
-                thumb_name_ = self.storage.save(thumb_name, thumb_content)
+def get_thumbnail_pool():
+    """
+    Returns the process pool which generates thumbnails in the background or
+    None if thumbnails are generated within the current thread. The size of
+    the pool is configured with LFC_THUMBNAIL_WORKERS. The pool is created on
+    first use and lives as long as the current process.
+    """
+    global _pool
+
+    workers = getattr(settings, "LFC_THUMBNAIL_WORKERS", 0)
+    if not workers:
+        return None
+
+    with _pool_lock:
+        if _pool is None:
+            _pool = multiprocessing.Pool(workers)
+    return _pool
+
+
+def wait_for_thumbnails():
+    """
+    Waits until all thumbnails which have been handed to the pool by the
+    current thread are stored. Errors of the workers are raised here.
+    """
+    jobs = getattr(_pending, "jobs", [])
+    _pending.jobs = []
+    for job in jobs:
+        job.get()
+
 
-                if not thumb_name == thumb_name_:
+def store_thumbs(storage, name, sizes, missing=False):
+    """
+    Generates and stores the thumbnails of passed sizes of the image with
+    passed name. See ImageWithThumbsFieldFile.generate_thumbs.
+    """
+    if missing:
+        sizes = [size for size in sizes
+                 if not storage.exists(get_thumb_name(name, size))]
+
+    if not sizes:
+        return
+
+    img = storage.open(name)
+    try:
+        # you can use another thumbnailing function if you like
+        for size, thumb_content in generate_thumbs(img, sizes, name.rsplit('.', 1)[1]):
+            thumb_name = get_thumb_name(name, size)
+            thumb_name_ = storage.save(thumb_name, thumb_content)
+
+            if not thumb_name == thumb_name_:
+                if missing:
+                    storage.delete(thumb_name_)
+                else:
                     raise ValueError('There is already a file named %s' % thumb_name)
+            set_thumb_stored(name, size)
+    finally:
+        img.close()
+
+
+def _store_thumbs_job(model, field_name, name, sizes, missing):
+    """
+    Runs store_thumbs within a worker of the pool. The storage is looked up
+    by the field, as storages can't be passed to other processes.
+    """
+    field = apps.get_model(model)._meta.get_field(field_name)
+    store_thumbs(field.storage, name, sizes, missing)
+
+
+class ImageWithThumbsFieldFile(ImageFieldFile):
+    """
+    See ImageWithThumbsField for usage example
+    """
+    def __init__(self, *args, **kwargs):
+        super(ImageWithThumbsFieldFile, self).__init__(*args, **kwargs)
+        self.sizes = self.field.sizes
+
+    def __getattr__(self, name):
+        """
+        Returns the URL of the thumbnail for url_[width]x[height].
+        """
+        match = re.match(r"^url_(\d+)x(\d+)$", name)
+        field = self.__dict__.get("field")
+        if match and field is not None:
+            size = (int(match.group(1)), int(match.group(2)))
+            if size in (field.sizes or ()):
+                return self.get_thumb_url(size)
+        raise AttributeError(name)
+
+    def get_thumb_url(self, size):
+        """
+        Returns the URL of the thumbnail with passed size. If the thumbnails
+        are generated lazily (see LFC_LAZY_THUMBNAILS) and the thumbnail
+        hasn't been recorded as stored (see set_thumb_stored), the URL of the
+        view is returned, which generates the thumbnail if it doesn't exist
+        yet and redirects to it. Afterwards the static URL is returned. So
+        the storage isn't asked for every URL.
+        """
+        if not self:
+            return ''
+
+        if getattr(settings, "LFC_LAZY_THUMBNAILS", False) and not is_thumb_stored(self.name, size):
+            return reverse("lfc_thumbnail", kwargs={"width": size[0], "height": size[1], "name": self.name})
+
+        split = self.url.rsplit('.', 1)
+        return '%s.%sx%s.%s' % (split[0], size[0], size[1], split[1])
+
+    def save(self, name, content, save=True, background=False):
+        """
+        Saves the image and generates its thumbnails, unless they are
+        generated lazily. If background is True the thumbnails might be
+        generated by the worker pool, see generate_thumbs.
+        """
+        super(ImageWithThumbsFieldFile, self).save(name, content, save)
+        if self.sizes and not getattr(settings, "LFC_LAZY_THUMBNAILS", False):
+            self.generate_thumbs(background=background)
+
+    def generate_thumbs(self, sizes=None, missing=False, background=False):
+        """
+        Generates and stores the thumbnails of passed sizes (all sizes of the
+        field if None).
+
+        If missing is True only thumbnails which don't exist yet are
+        generated. Thumbnails which have been stored concurrently by another
+        process are kept. Otherwise an existing thumbnail is an error.
+
+        If background is True and there is a worker pool (see
+        LFC_THUMBNAIL_WORKERS) the thumbnails are generated by the pool. Use
+        wait_for_thumbnails to wait until they are stored.
+        """
+        if sizes is None:
+            sizes = self.sizes
+
+        pool = background and get_thumbnail_pool()
+        if not pool:
+            store_thumbs(self.storage, self.name, sizes, missing)
+            return
+
+        model = "%s.%s" % (self.instance._meta.app_label, self.instance._meta.model_name)
+        job = pool.apply_async(_store_thumbs_job, (model, self.field.name, self.name, list(sizes), missing))
+        if not hasattr(_pending, "jobs"):
+            _pending.jobs = []
+        _pending.jobs.append(job)
 
     def delete(self, save=True):
         name = self.name
         super(ImageWithThumbsFieldFile, self).delete(save)
         if self.sizes:
             for size in self.sizes:
-                (w, h) = size
-                split = name.rsplit('.', 1)
-                thumb_name = '%s.%sx%s.%s' % (split[0], w, h, split[1])
+                thumb_name = get_thumb_name(name, size)
+                set_thumb_stored(name, size, False)
                 try:
                     self.storage.delete(thumb_name)
                 except:
@@ -1,12 +1,32 @@
 # django imports
 from django.conf import settings
+from django.contrib.auth.models import User
 from django.contrib.sites.models import Site
 from django.core.mail import EmailMessage
+from django.db.models.signals import m2m_changed
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+from django_comments.models import Comment
 from django_comments.signals import comment_was_posted
 
+# portlets imports
+from portlets.models import PortletAssignment
+from portlets.models import PortletBlocking
+
+# permissions imports
+from permissions.models import ObjectPermission
+from permissions.models import ObjectPermissionInheritanceBlock
+from permissions.models import PrincipalRoleRelation
+
 # lfc imports
 import lfc.signals
 import lfc.utils
+from lfc.models import BaseContent
+from lfc.models import ContentTypeRegistration
+from lfc.models import File
+from lfc.models import Image
+from lfc.models import Portal
+from lfc.utils.resolver import invalidate_permission_resolvers
 
 
 def comment_was_posted_listener(sender, **kwargs):
@@ -36,3 +56,58 @@ def comment_was_posted_listener(sender, **kwargs):
     mail.send(fail_silently=True)
 
 comment_was_posted.connect(comment_was_posted_listener)
+
+
+def content_type_registration_changed_listener(sender, **kwargs):
+    """Invalidates the cached registrations, see lfc.utils.registration.get_info.
+    """
+    lfc.utils.invalidate_cache(names=["registrations"])
+
+post_save.connect(content_type_registration_changed_listener, sender=ContentTypeRegistration)
+post_delete.connect(content_type_registration_changed_listener, sender=ContentTypeRegistration)
+
+
+def portal_changed_listener(sender, **kwargs):
+    """Invalidates all cache entries, as the portal is displayed on every
+    page.
+    """
+    lfc.utils.clear_cache()
+
+post_save.connect(portal_changed_listener, sender=Portal)
+
+
+def content_changed_listener(sender, instance, **kwargs):
+    """Invalidates the cache entries of the object to which the changed
+    image, file or comment belongs.
+    """
+    obj = instance.content_object if isinstance(instance, Comment) else instance.content
+    if isinstance(obj, BaseContent):
+        obj.invalidate_cache()
+    elif obj is not None:
+        lfc.utils.clear_cache()
+
+for model in (Image, File, Comment):
+    post_save.connect(content_changed_listener, sender=model)
+    post_delete.connect(content_changed_listener, sender=model)
+
+
+def portlets_changed_listener(sender, instance, **kwargs):
+    """Invalidates the cache entries of the object to which the changed
+    portlet is assigned and of its descendants, which inherit the portlets.
+    """
+    obj = instance.content
+    if isinstance(obj, BaseContent):
+        lfc.utils.invalidate_subtree(obj)
+    else:
+        lfc.utils.clear_cache()
+
+for model in (PortletAssignment, PortletBlocking):
+    post_save.connect(portlets_changed_listener, sender=model)
+    post_delete.connect(portlets_changed_listener, sender=model)
+
+
+# Permission resolvers
+for model in (ObjectPermission, ObjectPermissionInheritanceBlock, PrincipalRoleRelation):
+    post_save.connect(invalidate_permission_resolvers, sender=model)
+    post_delete.connect(invalidate_permission_resolvers, sender=model)
+m2m_changed.connect(invalidate_permission_resolvers, sender=User.groups.through)
@@ -1,5 +1,4 @@
 # python imports
-import copy
 import datetime
 import json
 import urlparse
@@ -58,6 +57,10 @@ from workflows.models import WorkflowPermissionRelation
 # lfc imports
 import lfc.signals
 import lfc.utils
+import lfc.utils.search
+from lfc.utils.copier import copy_object
+from lfc.utils.copier import generate_slug
+from lfc.fields.thumbs import wait_for_thumbnails
 from lfc.models import BaseContent
 from lfc.models import ContentTypeRegistration
 from lfc.models import Portal
@@ -82,7 +85,7 @@ from lfc.models import Application
 from lfc.models import File
 from lfc.models import History
 from lfc.models import Image
-from lfc.settings import COPY, CUT, IMAGE_SIZES
+from lfc.settings import COPY, CUT, IMAGE_SIZES, POSITION_GAP
 from lfc.utils import LazyEncoder
 from lfc.utils import MessageHttpResponseRedirect
 from lfc.utils import HttpJsonResponse
@@ -92,6 +95,9 @@ from lfc.utils import import_module
 from lfc.utils import render_to_json
 from lfc.utils.registration import get_allowed_subtypes
 from lfc.utils.registration import get_info
+from lfc.utils.search import get_reindex_progress
+from lfc.utils.tree import filter_nodes
+from lfc.utils.tree import get_tree
 
 # Load logger
 import logging
@@ -159,15 +165,15 @@ def add_object(request, language=None, id=None, template_name="lfc/manage/object
             new_object.creator = request.user
             new_object.language = language
 
-            amount = BaseContent.objects.filter(parent=parent_object, language__in=("0", language)).count()
-            new_object.position = (amount + 1) * 10
+            new_object.position = lfc.utils.get_next_position(
+                BaseContent.objects.filter(parent=parent_object, language__in=("0", language)).exclude(pk=new_object.pk))
 
             new_object.save()
 
             # Send signal
             lfc.signals.post_content_added.send(new_object)
 
-            _update_positions(new_object, True)
+            _update_positions(new_object, True, collisions_only=True)
 
             # Ugly, but works for now. The reason is that object_core
             # called via object_tabs tries to validate the form if the
@@ -361,6 +367,9 @@ def update_portal_permissions(request):
             else:
                 portal.remove_permission(role, permission)
 
+    # The portal permissions are inherited by all objects
+    lfc.utils.clear_cache()
+
     html = (
         ("#permissions", portal_permissions(request, portal)),
     )
@@ -574,13 +583,7 @@ def move_portal_child(request, child_id):
     obj = lfc.utils.get_content_object(pk=child_id)
 
     direction = request.GET.get("direction", 0)
-
-    if direction == "1":
-        obj.position += 15
-    else:
-        obj.position -= 15
-    obj.save()
-    _update_positions(None)
+    _move_child(obj, up=direction != "1")
 
     html = (
         ("#children", portal_children(request, portal)),
@@ -659,14 +662,13 @@ def add_portal_images(request):
     portal = lfc.utils.get_portal()
     portal.check_permission(user, "manage_portal")
 
+    # New images are appended, the existing ones are kept.
+    position = lfc.utils.get_next_position(portal.images.all())
     for file_content in request.FILES.getlist("file"):
-        image = Image(content=portal, title=file_content.name)
-        image.image.save(file_content.name, file_content, save=True)
-
-    # Refresh positions
-    for i, image in enumerate(portal.images.all()):
-        image.position = (i + 1) * 10
-        image.save()
+        image = Image(content=portal, title=file_content.name, position=position)
+        image.image.save(file_content.name, file_content, save=True, background=True)
+        position += POSITION_GAP
+    wait_for_thumbnails()
 
     return HttpResponse("")
 
@@ -698,21 +700,9 @@ def move_image(request, id):
     obj.check_permission(request.user, "edit")
 
     direction = request.GET.get("direction", 0)
-
-    if direction == "1":
-        image.position += 15
-    else:
-        image.position -= 15
-        if image.position < 0:
-            image.position = 10
-
+    lfc.utils.move_position(image, obj.images.all(), up=direction != "1")
     image.save()
 
-    # Refresh positions
-    for i, image in enumerate(obj.images.all()):
-        image.position = (i + 1) * 10
-        image.save()
-
     if isinstance(obj, Portal):
         images = portal_images(request, obj)
     else:
@@ -790,14 +780,12 @@ def add_portal_files(request):
     portal = lfc.utils.get_portal()
     portal.check_permission(user, "manage_portal")
 
+    # New files are appended, the existing ones are kept.
+    position = lfc.utils.get_next_position(portal.files.all())
     for file_content in request.FILES.getlist("file"):
-        file = File(content=portal, title=file_content.name)
+        file = File(content=portal, title=file_content.name, position=position)
         file.file.save(file_content.name, file_content, save=True)
-
-    # Refresh positions
-    for i, file in enumerate(portal.files.all()):
-        file.position = (i + 1) * 10
-        file.save()
+        position += POSITION_GAP
 
     return HttpResponse("result")
 
@@ -866,21 +854,9 @@ def move_file(request, id):
     obj.check_permission(request.user, "edit")
 
     direction = request.GET.get("direction", 0)
-
-    if direction == "1":
-        file.position += 15
-    else:
-        file.position -= 15
-        if file.position < 0:
-            file.position = 10
-
+    lfc.utils.move_position(file, obj.files.all(), up=direction != "1")
     file.save()
 
-    # Refresh positions
-    for i, file in enumerate(obj.files.all()):
-        file.position = (i + 1) * 10
-        file.save()
-
     if isinstance(obj, Portal):
         files = portal_files(request, obj)
     else:
@@ -1643,6 +1619,8 @@ def add_local_roles(request, id):
         if group and role:
             obj.add_role(group, role)
 
+    obj.invalidate_cache(descendants=True)
+
     message = _(u"Local roles has been added")
 
     html = (
@@ -1749,6 +1727,8 @@ def save_local_roles(request, id):
                 else:
                     obj.remove_role(group, role)
 
+    obj.invalidate_cache(descendants=True)
+
     html = (
         ("#local-roles", local_roles(request, obj)),
     )
@@ -1824,13 +1804,7 @@ def move_object_child(request, child_id):
     parent.check_permission(request.user, "edit")
 
     direction = request.GET.get("direction", 0)
-
-    if direction == "1":
-        obj.position += 15
-    else:
-        obj.position -= 15
-    obj.save()
-    _update_positions(parent)
+    _move_child(obj, up=direction != "1")
 
     html = (
         ("#children", object_children(request, parent)),
@@ -1880,16 +1854,13 @@ def add_object_images(request, id):
     obj.check_permission(user, "edit")
 
     if request.method == "POST":
+        # New images are appended, the existing ones are kept.
+        position = lfc.utils.get_next_position(obj.images.all())
         for file_content in request.FILES.getlist("file"):
-            image = Image(content=obj, title=file_content.name)
-            image.image.save(file_content.name, file_content, save=True)
-
-    # Refresh positions
-    for i, image in enumerate(obj.images.all()):
-        image.position = (i + 1) * 10
-        image.save()
-
-    lfc.utils.clear_cache()
+            image = Image(content=obj, title=file_content.name, position=position)
+            image.image.save(file_content.name, file_content, save=True, background=True)
+            position += POSITION_GAP
+        wait_for_thumbnails()
 
     files = []
     files.append({
@@ -1937,7 +1908,6 @@ def update_object_images(request, id):
     obj.check_permission(request.user, "edit")
 
     message = _update_images(request, obj)
-    lfc.utils.clear_cache()
 
     json = render_to_json(
         html=[["#images", object_images(request, obj)]],
@@ -1983,14 +1953,12 @@ def add_object_files(request, id):
     obj.check_permission(user, "edit")
 
     if request.method == "POST":
+        # New files are appended, the existing ones are kept.
+        position = lfc.utils.get_next_position(obj.files.all())
         for file_content in request.FILES.getlist("file"):
-            file = File(content=obj, title=file_content.name)
+            file = File(content=obj, title=file_content.name, position=position)
             file.file.save(file_content.name, file_content, save=True)
-
-    # Refresh positions
-    for i, file in enumerate(obj.files.all()):
-        file.position = (i + 1) * 10
-        file.save()
+            position += POSITION_GAP
 
     return HttpResponse("")
 
@@ -2059,6 +2027,8 @@ def update_object_permissions(request, id):
         else:
             obj.add_inheritance_block(permission)
 
+    obj.invalidate_cache(descendants=True)
+
     html = (
         ("#permissions", object_permissions(request, obj)),
     )
@@ -2231,7 +2201,6 @@ def add_portlet(request, object_type_id, object_id, template_name="lfc/manage/po
                     close_overlay=True,
                 )
 
-                lfc.utils.clear_cache()
                 update_portlet_positions(pa)
             else:
                 html = render_to_string(template_name, RequestContext(request, {
@@ -2273,7 +2242,6 @@ def delete_portlet(request, portletassignment_id):
     else:
         pa.portlet.delete()
         pa.delete()
-        lfc.utils.clear_cache()
         update_portlet_positions(pa)
 
         html = (
@@ -2335,7 +2303,6 @@ def edit_portlet(request, portletassignment_id, template_name="lfc/manage/portle
             # Save the rest
             pa.slot_id = request.POST.get("slot")
             pa.save()
-            lfc.utils.clear_cache()
             update_portlet_positions(pa)
 
             html = portlets_inline(request, pa.content)
@@ -2389,15 +2356,11 @@ def move_portlet(request, portletassignment_id):
     except PortletAssignment.DoesNotExist:
         return ""
 
+    # The positions of the portlets are small integers, see django-portlets.
     direction = request.GET.get("direction", "0")
-    if direction == "1":
-        pa.position += 15
-    else:
-        pa.position -= 15
-        if pa.position < 0:
-            pa.position = 10
+    portlets = PortletAssignment.objects.filter(content_type=pa.content_type, content_id=pa.content_id, slot=pa.slot)
+    lfc.utils.move_position(pa, portlets, up=direction != "1", gap=10)
     pa.save()
-    update_portlet_positions(pa)
 
     html = (
         ("#portlets", portlets_inline(request, pa.content)),
@@ -2445,40 +2408,37 @@ def navigation(request, obj, start_level=1, template_name="lfc/manage/navigation
     """
     nav_tree_lang = request.session.get("nav-tree-lang", settings.LANGUAGE_CODE)
 
+    tree = get_tree()
+
     if obj is None:
-        current_objs = []
+        current_ids = set()
         is_portal = True
     else:
-        current_objs = [obj]
-        current_objs.extend(obj.get_ancestors())
+        current_ids = set([obj.id])
+        node = tree.get_node(obj.id)
+        if node is not None:
+            current_ids.update([ancestor.id for ancestor in tree.get_ancestors(node)])
         is_portal = False
 
     # Display all objs which are neutral or in default language
-    q = Q(parent=None) & Q(language__in=("0", nav_tree_lang))
-
-    temps = lfc.utils.get_content_objects(request, q)
+    nodes = filter_nodes(request, [node for node in tree.get_children()
+        if node.language in ("0", nav_tree_lang)])
 
     objs = []
-    for temp in temps:
-        temp = temp.get_content_object()
-
-        if not temp.has_permission(request.user, "view"):
-            continue
-
-        if temp in current_objs:
-            children = _navigation_children(request, current_objs, temp, start_level)
+    for node in nodes:
+        if node.id in current_ids:
+            children = _navigation_children(request, tree, current_ids, node, start_level)
             is_current = True
         else:
             children = ""
             is_current = False
 
         objs.append({
-            "id": temp.id,
-            "title": temp.title,
+            "id": node.id,
+            "title": node.title,
             "is_current": is_current,
             "children": children,
             "level": 2,
-            "translations": temp.translations.all(),
         })
 
     languages = []
@@ -2501,16 +2461,19 @@ def navigation(request, obj, start_level=1, template_name="lfc/manage/navigation
     }))
 
 
-def _navigation_children(request, current_objs, obj, start_level, level=3):
-    """Renders the children of the given object (recursively).
+def _navigation_children(request, tree, current_ids, node, start_level, level=3):
+    """Renders the children of the given node (recursively).
 
     **Parameters:**
 
-        current_objs
-            A list of current_objs
+        tree
+            The snapshot of the content tree.
 
-        obj
-            The object for which the children should be rendered.
+        current_ids
+            The ids of the current object and its ancestors.
+
+        node
+            The node for which the children should be rendered.
 
         start_level
             The start level of the navigation tree.
@@ -2518,26 +2481,18 @@ def _navigation_children(request, current_objs, obj, start_level, level=3):
         level
             The current level of the navigation tree.
     """
-    obj = obj.get_content_object()
-    temp = obj.get_children(request)
-
     objs = []
-    for obj in temp:
-        obj = obj.get_content_object()
-
-        if not lfc.utils.registration.get_info(obj):
-            continue
-
-        if obj in current_objs:
-            children = _navigation_children(request, current_objs, obj, start_level, level + 1)
+    for node in filter_nodes(request, tree.get_children(node)):
+        if node.id in current_ids:
+            children = _navigation_children(request, tree, current_ids, node, start_level, level + 1)
             is_current = True
         else:
             children = ""
             is_current = False
 
         objs.append({
-            "id": obj.id,
-            "title": obj.title,
+            "id": node.id,
+            "title": node.title,
             "is_current": is_current,
             "children": children,
             "level": level,
@@ -3066,14 +3021,13 @@ def fb_upload_image(request):
     obj.check_permission(request.user, "edit")
 
     if request.method == "POST":
+        # New images are appended, the existing ones are kept.
+        position = lfc.utils.get_next_position(obj.images.all())
         for file_content in request.FILES.values():
-            image = Image(content=obj, title=file_content.name)
-            image.image.save(file_content.name, file_content, save=True)
-
-    # Refresh positions
-    for i, image in enumerate(obj.images.all()):
-        image.position = (i + 1) * 10
-        image.save()
+            image = Image(content=obj, title=file_content.name, position=position)
+            image.image.save(file_content.name, file_content, save=True, background=True)
+            position += POSITION_GAP
+        wait_for_thumbnails()
 
     html = (
         ("#overlay .content", imagebrowser(request, obj_id, as_string=True)),
@@ -3102,14 +3056,12 @@ def fb_upload_file(request):
     obj = lfc.utils.get_content_object(pk=obj_id)
     obj.check_permission(request.user, "edit")
 
+    # New files are appended, the existing ones are kept.
+    position = lfc.utils.get_next_position(obj.files.all())
     for file_content in request.FILES.values():
-        file = File(content=obj, title=file_content.name)
+        file = File(content=obj, title=file_content.name, position=position)
         file.file.save(file_content.name, file_content, save=True)
-
-    # Refresh positions
-    for i, file in enumerate(obj.files.all()):
-        file.position = (i + 1) * 10
-        file.save()
+        position += POSITION_GAP
 
     html = (
         ("#overlay .content", filebrowser(request, obj_id, as_string=True)),
@@ -3354,9 +3306,9 @@ def do_transition(request, id):
 
         workflows.utils.do_transition(obj, transition, request.user)
 
-        # CACHE
-        cache_key_1 = "%s-obj-%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, obj.get_absolute_url()[1:])
-        lfc.utils.delete_cache([cache_key_1])
+        # CACHE. The permissions of the object have been changed, which are
+        # inherited by the descendants.
+        obj.invalidate_cache(descendants=True)
 
         # Set publication date
         if obj.publication_date is None:
@@ -5001,7 +4953,7 @@ def checkin(request, id):
         base_parent.save()
         lfc.utils.clear_cache()
 
-    _update_positions(working_copy.parent)
+    _update_positions(working_copy.parent, collisions_only=True)
 
     return HttpResponseRedirect(reverse("lfc_manage_object", kwargs={"id": working_copy.id}))
 
@@ -5022,34 +4974,14 @@ def checkout(request, id):
         url = reverse("lfc_manage_object", kwargs={"id": source_obj.id})
         return MessageHttpResponseRedirect(url, _(u"Object has already a working copy."))
 
-    new_obj = copy.deepcopy(source_obj)
-    new_obj.pk = None
-    new_obj.id = None
-    new_obj.parent = source_obj.parent
-    new_obj.position = source_obj.position + 1
-
-    new_obj.slug = _generate_slug(new_obj, source_obj.parent)
-
-    # Workaround for django-tagging
-    try:
-        new_obj.save()
-    except IntegrityError:
-        pass
-
-    _copy_images(source_obj, new_obj)
-    _copy_files(source_obj, new_obj)
-    _copy_portlets(source_obj, new_obj)
-    _copy_translations(source_obj, new_obj)
+    new_obj = copy_object(source_obj, source_obj.parent_id, generate_slug(source_obj, source_obj.parent),
+                          source_obj.position + 1)
     _copy_history(source_obj, new_obj)
 
-    # Prevent recursion
-    if (new_obj not in source_obj.get_descendants()) and (new_obj != source_obj):
-        _copy_descendants(source_obj, new_obj)
-
     new_obj.working_copy_base = source_obj
     new_obj.save()
 
-    _update_positions(new_obj.parent)
+    _update_positions(new_obj.parent, collisions_only=True)
 
     return HttpResponseRedirect(reverse("lfc_manage_object", kwargs={"id": new_obj.id}))
 
@@ -5058,16 +4990,45 @@ def checkout(request, id):
 def manage_utils(request, template_name="lfc/manage/utils.html"):
     """Displays the overview over all utils.
     """
-    return render_to_response(template_name, RequestContext(request, {}))
+    return render_to_response(template_name, RequestContext(request, {
+        "reindex_progress": get_reindex_progress(),
+    }))
+
+
+def reindex_objects(request, template_name="lfc/manage/reindex.html"):
+    """Reindexes the searchable text of all content objects. Every request
+    reindexes the objects for some seconds and displays the progress, which
+    continues with the next request until all objects are reindexed.
 
+    The progress is passed from request to request within the query string,
+    as the cache might not be shared between processes.
 
-def reindex_objects(request):
-    """Reindexes the searchable text of all content objects.
+    **Query String:**
+
+        last_id, done, total
+            The progress of the reindexing which is continued (see
+            lfc.utils.search.reindex_objects). If not given the reindexing
+            starts from the beginning.
     """
-    for obj in lfc.utils.get_content_objects():
-        obj.reindex()
+    try:
+        progress = {
+            "last_id": int(request.GET["last_id"]),
+            "done": int(request.GET.get("done", 0)),
+            "total": int(request.GET.get("total", 0)),
+            "finished": False,
+        }
+    except (KeyError, ValueError):
+        progress = None
 
-    return MessageHttpResponseRedirect(reverse("lfc_manage_utils"), _(u"Objects have been reindexed."))
+    # Stay well below the usual request timeouts
+    progress = lfc.utils.search.reindex_objects(progress, seconds=5)
+
+    if progress["finished"]:
+        return MessageHttpResponseRedirect(reverse("lfc_manage_utils"), _(u"Objects have been reindexed."))
+
+    return render_to_response(template_name, RequestContext(request, {
+        "progress": progress,
+    }))
 
 
 # Private Methods ############################################################
@@ -5239,9 +5200,7 @@ def _update_images(request, obj):
             image.caption = request.POST.get("caption-%s" % image.id)
             image.save()
     # Refresh positions
-    for i, image in enumerate(obj.images.all()):
-        image.position = (i + 1) * 10
-        image.save()
+    lfc.utils.renumber_positions(obj.images.all())
     return message
 
 
@@ -5273,9 +5232,7 @@ def _update_files(request, obj):
             file.position = request.POST.get("position-%s" % file.id)
             file.save()
     # Refresh positions
-    for i, file in enumerate(obj.files.all()):
-        file.position = (i + 1) * 10
-        file.save()
+    lfc.utils.renumber_positions(obj.files.all())
     return message
 
 
@@ -5298,30 +5255,72 @@ def _display_action_menu(request, obj):
         return False
 
 
-def _update_positions(obj, take_parent=False):
+def _update_positions(obj, take_parent=False, collisions_only=False):
     """Updates position of given object's children. If take_parent is True
     the children of the given object's parent are updated.
+
+    If collisions_only is True the children are only renumbered if two of
+    them have the same position, so that the gaps between the positions
+    (see lfc.utils.move_position) are kept otherwise.
+
+    The new positions are written with one query and the caches are
+    invalidated once, instead of saving every child.
     """
     if take_parent:
         parent = obj.parent
     else:
         parent = obj
 
+    positions = {}
     for language in settings.LANGUAGES:
         if language[0] == settings.LANGUAGE_CODE:
             objs = BaseContent.objects.filter(parent=parent, language__in=("0", language[0]))
         else:
             objs = BaseContent.objects.filter(parent=parent, language=language[0])
 
-        for i, p in enumerate(objs):
-            p.position = (i + 1) * 10
-            p.save()
-            if obj and obj.id == p.id:
-                obj = p
+        rows = list(objs.values_list("id", "position"))
+        if collisions_only and len(set([position for id, position in rows])) == len(rows):
+            continue
+
+        for i, (id, position) in enumerate(rows):
+            if position != (i + 1) * POSITION_GAP:
+                positions[id] = (i + 1) * POSITION_GAP
+
+    if not positions:
+        return obj
+
+    lfc.utils.set_positions(BaseContent, positions)
+
+    # The children list the position within the navigation, the parent lists
+    # them in order.
+    children = list(BaseContent.objects.filter(pk__in=positions.keys()))
+    lfc.utils.invalidate_cache(children + [parent or ""], names=["navigation"])
+
+    if obj and obj.id in positions:
+        obj.position = positions[obj.id]
+        if hasattr(obj, "_loaded_navigation"):
+            obj._loaded_navigation = [getattr(obj, name) for name in obj.navigation_fields]
 
     return obj
 
 
+def _move_child(obj, up):
+    """Moves passed content object one place up or down within its siblings
+    of the same language (see _update_positions). In the common case only
+    the object itself is saved, see lfc.utils.move_position.
+    """
+    if obj.language in ("0", settings.LANGUAGE_CODE):
+        siblings = BaseContent.objects.filter(parent=obj.parent_id, language__in=("0", settings.LANGUAGE_CODE))
+    else:
+        siblings = BaseContent.objects.filter(parent=obj.parent_id, language=obj.language)
+
+    changed = lfc.utils.move_position(obj, siblings, up)
+    obj.save()
+
+    if changed:
+        lfc.utils.invalidate_cache(list(BaseContent.objects.filter(pk__in=changed)))
+
+
 def _has_permission(obj, role, codename):
     """Checks whether the passed group has passed permission for passed object.
 
@@ -5392,93 +5391,44 @@ def _paste(request, obj):
             error_msg = _(u"Some objects are not allowed here.")
             continue
 
-        descendants = source_obj.get_descendants()
+        is_descendant = target is not None and target.is_descendant_of(source_obj)
         if action == CUT:
 
             # Don't cut and paste to own descendants
-            if target in descendants or target == source_obj or target == source_obj.parent:
+            if is_descendant or target == source_obj or target == source_obj.parent:
                 error_msg = _(u"The objects can't be pasted in own descendants.")
                 break
 
             source_obj.parent_id = target_id
-            source_obj.slug = _generate_slug(source_obj, target)
+            source_obj.slug = generate_slug(source_obj, target)
 
             if source_obj.language == "0":
-                amount = BaseContent.objects.filter(parent=target_id, language__in=("0", translation.get_language())).count()
+                siblings = BaseContent.objects.filter(parent=target_id, language__in=("0", translation.get_language()))
             else:
-                amount = BaseContent.objects.filter(parent=target_id, language__in=("0", source_obj.language)).count()
+                siblings = BaseContent.objects.filter(parent=target_id, language__in=("0", source_obj.language))
 
-            source_obj.position = (amount + 1) * 10
+            source_obj.position = lfc.utils.get_next_position(siblings.exclude(pk=source_obj.pk))
             source_obj.save()
 
             _reset_clipboard(request)
         else:
             # Paste
-            target_obj = copy.deepcopy(source_obj)
-            target_obj.pk = None
-            target_obj.id = None
-            target_obj.parent_id = target_id
-
-            amount = BaseContent.objects.filter(parent=target_id, language__in=("0", source_obj.language)).count()
-            target_obj.position = (amount + 1) * 10
-
-            target_obj.slug = _generate_slug(source_obj, target)
-
-            # Workaround for django-tagging
-            try:
-                target_obj.save()
-            except IntegrityError:
-                pass
-
-            _copy_images(source_obj, target_obj)
-            _copy_files(source_obj, target_obj)
-            _copy_portlets(source_obj, target_obj)
-            _copy_translations(source_obj, target_obj)
+            position = lfc.utils.get_next_position(
+                BaseContent.objects.filter(parent=target_id, language__in=("0", source_obj.language)))
 
             # Prevent recursion
-            if target not in descendants and target != source_obj:
-                _copy_descendants(source_obj, target_obj)
+            copy_object(source_obj, target_id, generate_slug(source_obj, target), position,
+                        descendants=not is_descendant and target != source_obj)
 
     if error_msg:
         msg = error_msg
     else:
-        _update_positions(to_updated_obj)
+        _update_positions(to_updated_obj, collisions_only=True)
         msg = _(u"The object has been pasted.")
 
     return msg
 
 
-def _generate_slug(source_obj, parent):
-    """Generates a unique slug for passed source_obj in passed parent
-
-    **Parameters:**
-
-        source_obj
-            The object for which the slug should be generated
-
-        parent
-            The object in which the source_obj should be pasted. The slug
-            which is created is unique within parent.
-    """
-    # Generate slug for pasted object
-    new_slug = source_obj.slug
-    try:
-        BaseContent.objects.get(slug=new_slug, parent=parent, language=source_obj.language)
-    except BaseContent.DoesNotExist:
-        pass
-    else:
-        i = 1
-        while 1:
-            new_slug = source_obj.slug + "-%s" % i
-            try:
-                BaseContent.objects.get(slug=new_slug, parent=parent, language=source_obj.language)
-            except BaseContent.DoesNotExist:
-                break
-            i += 1
-
-    return new_slug
-
-
 def _reset_clipboard(request):
     """Resets the clipboard.
     """
@@ -5488,106 +5438,6 @@ def _reset_clipboard(request):
         del request.session["clipboard_action"]
 
 
-def _copy_descendants(source_obj, target_obj):
-    """Copies all descendants (recursively) from source_obj to target_obj.
-    This includes: children, images, files, portlets and translations.
-
-    **Parameters:**
-
-        source_obj
-            The object from which the descendants will be copied.
-
-        target_obj
-            The object to which the descendants will be copied.
-    """
-    for child in source_obj.children.all().get_content_objects():
-        new_child = copy.deepcopy(child)
-        new_child.pk = None
-        new_child.id = None
-        new_child.parent = target_obj
-        new_child.save()
-
-        _copy_images(child, new_child)
-        _copy_files(child, new_child)
-        _copy_portlets(child, new_child)
-        _copy_descendants(child, new_child)
-        _copy_translations(child, new_child)
-
-
-def _copy_images(source_obj, target_obj):
-    """Copies all images from source_obj to target_obj.
-
-        source_obj
-            The object from which the images will be copied.
-
-        target_obj
-            The object to which the images will be copied.
-    """
-    for image in source_obj.images.all():
-        new_image = Image(content=target_obj, title=image.title)
-        new_image.image.save(image.image.name, image.image.file, save=True)
-        new_image.save()
-
-
-def _copy_files(source_obj, target_obj):
-    """Copies all files from source_obj to target_obj.
-
-        source_obj
-            The object from which the files will be copied.
-
-        target_obj
-            The object to which the files will be copied.
-    """
-    for file in source_obj.files.all():
-        new_file = File(content=target_obj, title=file.title)
-        new_file.file.save(file.file.name, file.file.file, save=True)
-        new_file.save()
-
-
-def _copy_portlets(source_obj, target_obj):
-    """Copies all portlets from source_obj to target_obj.
-
-        source_obj
-            The object from which the portlets will be copied.
-
-        target_obj
-            The object to which the portlets will be copied.
-    """
-    ct = ContentType.objects.get_for_model(source_obj)
-    for pa in PortletAssignment.objects.filter(content_id=source_obj.id, content_type=ct):
-        new_pa = copy.deepcopy(pa)
-        new_pa.pk = None
-        new_pa.id = None
-        new_pa.content_id = target_obj.id
-        new_pa.save()
-
-
-def _copy_translations(source_obj, target_obj):
-    """Copies all translations from source_obj to target_obj.
-
-        source_obj
-            The object from which the translations will be copied.
-
-        target_obj
-            The object to which the translations will be copied.
-    """
-    for translation in source_obj.translations.all().get_content_objects():
-        new_translation = copy.deepcopy(translation)
-        new_translation.pk = None
-        new_translation.id = None
-        new_translation.slug = _generate_slug(translation, translation.parent)
-        new_translation.canonical = target_obj
-
-        amount = BaseContent.objects.filter(parent=translation.parent, language__in=("0", translation.language)).count()
-        new_translation.position = (amount + 1) * 10
-        new_translation.save()
-
-        _copy_images(translation, new_translation)
-        _copy_files(translation, new_translation)
-        _copy_portlets(translation, new_translation)
-        _copy_descendants(translation, new_translation)
-
-
 def _copy_history(source_obj, target_obj):
     """Copies the history from source_obj to target_obj.
 
@@ -0,0 +1,28 @@
+# django imports
+from django.core.management.base import BaseCommand
+
+# lfc imports
+from lfc.utils.search import REINDEX_BATCH_SIZE
+from lfc.utils.search import get_reindex_progress
+from lfc.utils.search import reindex_objects
+
+
+class Command(BaseCommand):
+    help = """Reindexes the searchable text of all content objects
+
+    An interrupted reindexing is resumed (as long as its progress is cached),
+    unless --restart is given."""
+
+    def add_arguments(self, parser):
+        parser.add_argument("--restart", action="store_true", dest="restart", default=False,
+                            help="Start from the beginning, even if the last reindexing hasn't been finished.")
+        parser.add_argument("--batch-size", type=int, dest="batch_size", default=REINDEX_BATCH_SIZE,
+                            help="The number of objects which are reindexed at once.")
+
+    def handle(self, *args, **options):
+        progress = None if options["restart"] else get_reindex_progress()
+        while True:
+            progress = reindex_objects(progress, seconds=10, batch_size=options["batch_size"])
+            self.stdout.write("%s of %s objects reindexed" % (progress["done"], progress["total"]))
+            if progress["finished"]:
+                break
@@ -11,10 +11,29 @@ class BaseContentQuerySet(QuerySet):
         a QuerySet chain, e.g.::
 
             BaseContent.objects.filter(language="en").exclude(pk=1).get_content_objects()
+
+        The specific objects are loaded with one query per content type and
+        are returned in the order of the QuerySet.
         """
+        objs = list(self.all())
+
+        ids_by_type = {}
+        for obj in objs:
+            if obj.__class__.__name__.lower() != "basecontent":
+                continue
+            ids_by_type.setdefault(obj.content_type, []).append(obj.id)
+
+        content_objects = {}
+        for content_type, ids in ids_by_type.items():
+            for obj in get_content_model(content_type).objects.filter(pk__in=ids):
+                content_objects[obj.id] = obj
+
         result = []
-        for obj in self.all():
-            result.append(obj.get_content_object())
+        for obj in objs:
+            if obj.__class__.__name__.lower() != "basecontent":
+                result.append(obj)
+            elif obj.id in content_objects:
+                result.append(content_objects[obj.id])
 
         return result
 
@@ -26,3 +45,10 @@ class BaseContentManager(models.Manager):
         """Overwritten to return BaseContentQuerySet.
         """
         return BaseContentQuerySet(self.model)
+
+
+def get_content_model(content_type):
+    """Returns the model class for passed content type, e.g. "page".
+    """
+    from lfc.models import BaseContent
+    return getattr(BaseContent, content_type).related.field.model
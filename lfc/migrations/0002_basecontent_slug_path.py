@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+def set_slug_paths(apps, schema_editor):
+    """Calculates the slug paths of all existing content objects, level by
+    level starting with the top level objects.
+    """
+    BaseContent = apps.get_model("lfc", "BaseContent")
+    max_length = BaseContent._meta.get_field("slug_path").max_length
+
+    paths = {}
+    for id, slug in BaseContent.objects.filter(parent=None).values_list("id", "slug"):
+        paths[id] = slug if len(slug) <= max_length else ""
+        BaseContent.objects.filter(pk=id).update(slug_path=paths[id])
+
+    while paths:
+        new_paths = {}
+        for id, parent_id, slug in BaseContent.objects.filter(parent__in=paths.keys()).values_list("id", "parent", "slug"):
+            path = paths[parent_id] and paths[parent_id] + "/" + slug
+            if len(path) > max_length:
+                path = ""
+            new_paths[id] = path
+            BaseContent.objects.filter(pk=id).update(slug_path=path)
+        paths = new_paths
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lfc', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='basecontent',
+            name='slug_path',
+            field=models.CharField(max_length=255, verbose_name='Slug path', blank=True),
+        ),
+        migrations.AlterIndexTogether(
+            name='basecontent',
+            index_together=set([('slug_path', 'language')]),
+        ),
+        migrations.RunPython(set_slug_paths, migrations.RunPython.noop),
+    ]
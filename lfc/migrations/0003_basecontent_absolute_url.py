@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.core.urlresolvers import get_script_prefix
+from django.core.urlresolvers import reverse
+from django.db import models, migrations
+
+
+def calculate_url(slug_path, language, parent_language):
+    """Returns the URL (without the script prefix) of an object with passed
+    slug path and language. A copy of lfc.models._calculate_url at the time
+    of this migration.
+    """
+    if not slug_path:
+        return ""
+
+    if language == "0":
+        if parent_language is None:
+            return ""
+        language = parent_language
+
+    if language in ("0", settings.LANGUAGE_CODE):
+        url = reverse("lfc_base_view", kwargs={"slug": slug_path})
+    else:
+        url = reverse("lfc_base_view", kwargs={"slug": slug_path, "language": language})
+
+    url = url[len(get_script_prefix()):]
+    if len(url) > 300:
+        return ""
+
+    return url
+
+
+def set_absolute_urls(apps, schema_editor):
+    """Calculates the absolute URLs of all existing content objects, level by
+    level starting with the top level objects.
+    """
+    BaseContent = apps.get_model("lfc", "BaseContent")
+
+    own_urls = {}
+    standards = {}
+
+    level = {None: None}
+    while level:
+        new_level = {}
+        objs = BaseContent.objects.filter(parent__in=[id for id in level.keys() if id is not None])
+        if None in level:
+            objs = BaseContent.objects.filter(parent=None)
+        for id, parent_id, slug_path, language, standard_id in objs.values_list("id", "parent", "slug_path", "language", "standard"):
+            own_urls[id] = calculate_url(slug_path, language, level[parent_id])
+            if standard_id:
+                standards[id] = standard_id
+            new_level[id] = language
+        level = new_level
+
+    for id, url in own_urls.items():
+        if id in standards:
+            url = own_urls.get(standards[id], "")
+        BaseContent.objects.filter(pk=id).update(absolute_url=url)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lfc', '0002_basecontent_slug_path'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='basecontent',
+            name='absolute_url',
+            field=models.CharField(max_length=300, verbose_name='Absolute URL', blank=True),
+        ),
+        migrations.RunPython(set_absolute_urls, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+def create_tree_relations(apps, schema_editor):
+    """Creates the tree index for all existing content objects.
+    """
+    BaseContent = apps.get_model("lfc", "BaseContent")
+    ContentTreeRelation = apps.get_model("lfc", "ContentTreeRelation")
+
+    parents = dict(BaseContent.objects.values_list("id", "parent"))
+
+    relations = []
+    for id in parents.keys():
+        depth = 0
+        ancestor_id = id
+        while ancestor_id is not None:
+            relations.append(ContentTreeRelation(ancestor_id=ancestor_id, descendant_id=id, depth=depth))
+            ancestor_id = parents.get(ancestor_id)
+            depth += 1
+
+    ContentTreeRelation.objects.bulk_create(relations, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lfc', '0003_basecontent_absolute_url'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContentTreeRelation',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('depth', models.PositiveIntegerField(verbose_name='Depth')),
+                ('ancestor', models.ForeignKey(related_name='descendant_relations', verbose_name='Ancestor', to='lfc.BaseContent')),
+                ('descendant', models.ForeignKey(related_name='ancestor_relations', verbose_name='Descendant', to='lfc.BaseContent')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='contenttreerelation',
+            unique_together=set([('ancestor', 'descendant')]),
+        ),
+        migrations.RunPython(create_tree_relations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import re
+
+from django.db import models, migrations
+
+
+def get_terms(text):
+    """Returns the terms of passed text as dict of term -> frequency. A copy
+    of lfc.utils.search.get_terms at the time of this migration.
+    """
+    terms = {}
+    for term in re.findall(r"\w+", (text or "").lower(), re.UNICODE):
+        if len(term) >= 2:
+            term = term[:50]
+            terms[term] = terms.get(term, 0) + 1
+    return terms
+
+
+def create_search_index(apps, schema_editor):
+    """Indexes the searchable text of all existing content objects.
+    """
+    BaseContent = apps.get_model("lfc", "BaseContent")
+    SearchIndex = apps.get_model("lfc", "SearchIndex")
+
+    entries = []
+    objs = BaseContent.objects.filter(exclude_from_search=False)
+    for id, language, searchable_text in objs.values_list("id", "language", "searchable_text").iterator():
+        for term, frequency in get_terms(searchable_text).items():
+            entries.append(SearchIndex(term=term, content_id=id, language=language, frequency=frequency))
+        if len(entries) >= 500:
+            SearchIndex.objects.bulk_create(entries)
+            entries = []
+
+    SearchIndex.objects.bulk_create(entries)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lfc', '0004_contenttreerelation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchIndex',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('term', models.CharField(max_length=50, verbose_name='Term')),
+                ('language', models.CharField(max_length=10, verbose_name='Language')),
+                ('frequency', models.PositiveIntegerField(default=1, verbose_name='Frequency')),
+                ('content', models.ForeignKey(related_name='search_terms', verbose_name='Content', to='lfc.BaseContent')),
+            ],
+        ),
+        migrations.AlterIndexTogether(
+            name='searchindex',
+            index_together=set([('term', 'language')]),
+        ),
+        migrations.RunPython(create_search_index, migrations.RunPython.noop),
+    ]
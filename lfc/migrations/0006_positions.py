@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lfc', '0005_searchindex'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='basecontent',
+            name='position',
+            field=models.IntegerField(default=1, verbose_name='Position'),
+        ),
+        migrations.AlterField(
+            model_name='file',
+            name='position',
+            field=models.IntegerField(default=999),
+        ),
+        migrations.AlterField(
+            model_name='image',
+            name='position',
+            field=models.IntegerField(default=999, verbose_name='Position'),
+        ),
+    ]
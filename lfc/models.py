@@ -3,14 +3,15 @@ import datetime
 import re
 
 # django imports
-from django import template
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.contrib.contenttypes import generic
 from django.contrib.contenttypes.models import ContentType
 from django.core.cache import cache
+from django.core.urlresolvers import get_script_prefix
 from django.core.urlresolvers import reverse
 from django.db import models
+from django.db.models import Q
 from django.template import RequestContext
 from django.template.loader import render_to_string
 from django.utils import translation
@@ -35,7 +36,6 @@ from workflows.models import StateObjectRelation
 # permissions imports
 from permissions import PermissionBase
 from permissions.exceptions import Unauthorized
-from permissions.models import Role
 from permissions.models import ObjectPermission
 from permissions.models import ObjectPermissionInheritanceBlock
 
@@ -50,6 +50,10 @@ from lfc.settings import LANGUAGE_CHOICES
 from lfc.settings import ORDER_BY_CHOICES
 from lfc.settings import IMAGE_SIZES
 from lfc.settings import UPLOAD_FOLDER
+from lfc.utils.resolver import get_permission_fingerprint
+from lfc.utils.resolver import get_permission_resolver
+from lfc.utils.resolver import invalidate_permission_resolvers
+from lfc.utils.search import get_search_backend
 
 
 class Application(models.Model):
@@ -309,20 +313,7 @@ class Portal(models.Model, PermissionBase):
         Overwrites django-permissions' has_permission in order to add LFC
         specific groups.
         """
-        # Every user is also anonymous user
-        try:
-            roles = [lfc.utils.get_cached_object(Role, name="Anonymous").id]
-        except Role.DoesNotExist:
-            roles = []
-
-        # Check whether the current user is the creator of the current object.
-        try:
-            if user == self.creator:
-                roles.append(Role.objects.get(name="Owner").id)
-        except (AttributeError, Role.DoesNotExist):
-            pass
-
-        return super(Portal, self).has_permission(user, codename, roles)
+        return get_permission_resolver(user).has_permission(self, codename)
 
     def check_permission(self, user, codename):
         """
@@ -457,6 +448,17 @@ class BaseContent(AbstractBaseContent):
     searchable_text
         The content which is searched for this object. This attribute should
         not get directly. Rather the get_searchable_text method should be used.
+
+    slug_path
+        The slugs of all ancestors and the object itself joined by "/". This is
+        maintained automatically on save and is used to find an object by its
+        URL with one query. It is empty if the path is longer than the field.
+
+    absolute_url
+        The precomputed URL of the object (without the script prefix). This is
+        maintained automatically on save. It is empty if the URL depends on the
+        current language (top level objects with neutral language), in which
+        case the URL is calculated on the fly.
     """
     content_type = models.CharField(_(u"Content type"), max_length=100, blank=True)
 
@@ -467,7 +469,7 @@ class BaseContent(AbstractBaseContent):
 
     description = models.TextField(_(u"Description"), blank=True)
 
-    position = models.PositiveSmallIntegerField(_(u"Position"), default=1)
+    position = models.IntegerField(_(u"Position"), default=1)
 
     language = models.CharField(_(u"Language"), max_length=10, choices=LANGUAGE_CHOICES, default="0")
     canonical = models.ForeignKey("self", verbose_name=_(u"Canonical"), related_name="translations", blank=True, null=True, on_delete=models.SET_NULL)
@@ -503,14 +505,26 @@ class BaseContent(AbstractBaseContent):
         choices=ALLOW_COMMENTS_CHOICES, default=ALLOW_COMMENTS_DEFAULT)
 
     searchable_text = models.TextField(blank=True)
+    slug_path = models.CharField(_(u"Slug path"), max_length=255, blank=True)
+    absolute_url = models.CharField(_(u"Absolute URL"), max_length=300, blank=True)
 
     working_copy_base = models.ForeignKey("self", verbose_name=_(u"Working copy base"), related_name="working_copies", blank=True, null=True, on_delete=models.SET_NULL)
 
     version = models.PositiveSmallIntegerField(blank=True, null=True)
 
+    # The fields which are displayed within the navigation, e.g. tabs and
+    # breadcrumbs, or which determine it. See save and lfc.utils.tree.
+    navigation_fields = ("title", "slug", "position", "language", "parent_id", "standard_id",
+                         "order_by", "exclude_from_navigation", "start_date", "end_date",
+                         "publication_date", "creator_id")
+
+    # The fields of sub classes which may contain template tags. See render.
+    template_fields = ("text", "short_text")
+
     class Meta:
         ordering = ["position"]
         unique_together = ["parent", "slug", "language"]
+        index_together = ["slug_path", "language"]
 
     def __unicode__(self):
         return unicode(self.title)
@@ -548,19 +562,74 @@ class BaseContent(AbstractBaseContent):
     def save(self, *args, **kwargs):
         """Django's default save method. This is overwritten to do some LFC
         related stuff when a content object is saved.
+
+        Copies of objects (see lfc.utils.copier.copy_object) are saved with
+        the attribute _copying set to True. Then this bookkeeping is skipped,
+        as the copy engine does it for all copies at once, but the save
+        methods of sub classes are still called.
         """
+        if getattr(self, "_copying", False):
+            super(BaseContent, self).save(*args, **kwargs)
+            self._loaded_search = [self.searchable_text, self.language, self.exclude_from_search]
+            self._loaded_language = self.language
+            self._loaded_parent_id = self.parent_id
+            self._loaded_navigation = [getattr(self, name) for name in self.navigation_fields]
+            return
+
         self.searchable_text = self.get_searchable_text()
         if self.content_type == "":
             self.content_type = self.__class__.__name__.lower()
 
+        is_new = self.pk is None
+        old_slug_path = self.slug_path
+        parent_path, parent_language = self._get_parent_data()
+        self.slug_path = _join_slug_path(parent_path, self.slug)
+        if self.standard_id:
+            self.absolute_url = self.standard.get_own_url()
+        else:
+            self.absolute_url = _calculate_url(self.slug_path, self.language, parent_language)
+
         super(BaseContent, self).save(*args, **kwargs)
 
+        self.update_tree_relations(is_new)
+
+        search = [self.searchable_text, self.language, self.exclude_from_search]
+        if search != getattr(self, "_loaded_search", None):
+            get_search_backend().index(self)
+        self._loaded_search = search
+
+        # The paths and URLs of the descendants are based on the own path and
+        # language.
+        old_parent_id = getattr(self, "_loaded_parent_id", self.parent_id)
+        moved = not is_new and (old_slug_path != self.slug_path or old_parent_id != self.parent_id or
+                                getattr(self, "_loaded_language", self.language) != self.language)
+        if moved:
+            self.update_descendant_urls()
+        self._loaded_language = self.language
+        self._loaded_parent_id = self.parent_id
+
         # Set the initial state if there is none yet
         co = self.get_content_object()
         if workflows.utils.get_state(co) is None:
             workflows.utils.set_initial_state(co)
 
-        lfc.utils.clear_cache()
+        # CACHE. If the object has been moved the entries of the old path and
+        # of the old parent, which lists the object as child, are stale.
+        if moved:
+            if old_slug_path:
+                old_parent = old_slug_path.rpartition("/")[0]
+            elif old_parent_id:
+                old_parent = BaseContent.objects.get(pk=old_parent_id)
+            else:
+                old_parent = ""
+            lfc.utils.invalidate_cache([old_parent])
+            lfc.utils.invalidate_subtree(old_slug_path or self)
+        self.invalidate_cache(descendants=moved)
+
+        navigation = [getattr(self, name) for name in self.navigation_fields]
+        if navigation != getattr(self, "_loaded_navigation", None):
+            lfc.utils.invalidate_cache(names=["navigation"])
+        self._loaded_navigation = navigation
 
     def delete(self, *args, **kwargs):
         """Djangos default delete method. This is overwritten to take care
@@ -612,43 +681,209 @@ class BaseContent(AbstractBaseContent):
             pa.delete()
         PortletBlocking.objects.filter(content_id=self.id, content_type=ctype).delete()
 
+        self.invalidate_cache(descendants=True)
+
         # call Djangos delete method
         super(BaseContent, self).delete(*args, **kwargs)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Overwritten to remember the language, parent, navigation fields and
+        searchable data the object has been loaded with. See save.
+        """
+        instance = super(BaseContent, cls).from_db(db, field_names, values)
+        instance._loaded_search = [instance.__dict__.get(name) for name in
+                                   ("searchable_text", "language", "exclude_from_search")]
+        instance._loaded_language = instance.__dict__.get("language")
+        instance._loaded_parent_id = instance.__dict__.get("parent_id")
+        instance._loaded_navigation = [instance.__dict__.get(name) for name in cls.navigation_fields]
+        return instance
+
+    def invalidate_cache(self, descendants=False):
+        """Invalidates all cache entries which depend on the object (see
+        lfc.utils.get_cache_key), including the ones of the parent, which
+        lists the object as child, and of the translations, which list the
+        object as translation.
+
+        **Parameters:**
+
+        descendants
+            If True the entries which depend on the descendants of the object
+            are invalidated too (with one increment of the subtree
+            generation). This is needed if something is changed which is
+            inherited, e.g. the path or permissions. As this changes the
+            visibility of objects the navigation is invalidated as well.
+        """
+        # The path of the parent is part of the own one, see slug_path.
+        if self.slug_path or self.parent_id is None:
+            parent = self.slug_path.rpartition("/")[0]
+        else:
+            parent = self.parent
+
+        translations = list(BaseContent.objects.filter(
+            Q(pk=self.canonical_id) | Q(canonical=self.canonical_id or self.id)).exclude(pk=self.id))
+
+        # The standard object of the portal (or a translation of it) is
+        # displayed as start page, see lfc.views.base_view.
+        names = []
+        if Portal.objects.filter(standard__in=[self.id] + [t.id for t in translations]).exists():
+            names.append("standard")
+        if descendants:
+            names.append("navigation")
+
+        lfc.utils.invalidate_cache([self, parent] + translations, names)
+        if descendants:
+            lfc.utils.invalidate_subtree(self)
+
     def get_absolute_url(self):
         """Returns the absolute url of the instance. Takes care of nested
         content objects.
         """
-        page = self.standard or self
+        if self.absolute_url:
+            return get_script_prefix() + self.absolute_url
 
-        obj = page
-        slugs = []
-        while obj is not None:
-            slugs.append(obj.slug)
-            obj = obj.parent
-
-        slugs.reverse()
+        # The URL isn't stored, because it depends on the current language or
+        # it is too long.
+        page = self.standard or self
 
-        slug = "/".join(slugs)
+        if page.slug_path:
+            slug = page.slug_path
+        else:
+            obj = page
+            slugs = []
+            while obj is not None:
+                slugs.append(obj.slug)
+                obj = obj.parent
+            slugs.reverse()
+            slug = "/".join(slugs)
 
         if page.language == settings.LANGUAGE_CODE:
-            return ("lfc_base_view", (), {"slug": slug})
+            return reverse("lfc_base_view", kwargs={"slug": slug})
         elif page.language == "0":
             if page.parent:
                 language = page.parent.language
                 if language == "0":
-                    return ("lfc_base_view", (), {"slug": slug})
+                    return reverse("lfc_base_view", kwargs={"slug": slug})
             else:
                 language = translation.get_language()
 
             if language == settings.LANGUAGE_CODE:
-                return ("lfc_base_view", (), {"slug": slug})
+                return reverse("lfc_base_view", kwargs={"slug": slug})
             else:
-                return ("lfc_base_view", (), {"slug": slug, "language": language})
+                return reverse("lfc_base_view", kwargs={"slug": slug, "language": language})
         else:
-            return ("lfc_base_view", (), {"slug": slug, "language": page.language})
+            return reverse("lfc_base_view", kwargs={"slug": slug, "language": page.language})
 
-    get_absolute_url = models.permalink(get_absolute_url)
+    def get_own_url(self):
+        """Returns the URL which is stored as absolute_url for the object,
+        without taking the standard object into account.
+        """
+        if self.language == "0":
+            parent_path, parent_language = self._get_parent_data()
+        else:
+            parent_language = None
+        return _calculate_url(self.slug_path, self.language, parent_language)
+
+    def get_slug_path(self):
+        """Returns the slugs of all ancestors and the object itself joined by
+        "/". Returns an empty string if the path doesn't fit into the slug_path
+        field.
+        """
+        parent_path, parent_language = self._get_parent_data()
+        return _join_slug_path(parent_path, self.slug)
+
+    def update_descendant_urls(self):
+        """Updates the slug paths and absolute URLs of all descendants of the
+        object and of all objects which use one of them (or the object itself)
+        as standard. This has to be called after the slug path or the language
+        of the object has been changed.
+        """
+        own_urls = {self.id: self.get_own_url()}
+        paths = {}
+        standards = {}
+
+        # Parents are processed before their children as the descendants are
+        # ordered by depth.
+        data = {self.id: (self.slug_path, self.language)}
+        descendants = ContentTreeRelation.objects.filter(ancestor=self, depth__gt=0).order_by("depth").values_list(
+            "descendant", "descendant__parent", "descendant__slug", "descendant__language", "descendant__standard")
+
+        for id, parent_id, slug, language, standard_id in descendants:
+            parent_path, parent_language = data[parent_id]
+            paths[id] = _join_slug_path(parent_path, slug)
+            own_urls[id] = _calculate_url(paths[id], language, parent_language)
+            if standard_id:
+                standards[id] = standard_id
+            data[id] = (paths[id], language)
+
+        for id, path in paths.items():
+            standard_id = standards.get(id)
+            if standard_id is None:
+                url = own_urls[id]
+            elif standard_id in own_urls:
+                url = own_urls[standard_id]
+            else:
+                url = BaseContent.objects.get(pk=standard_id).get_own_url()
+            BaseContent.objects.filter(pk=id).update(slug_path=path, absolute_url=url)
+
+        # Objects outside of the subtree which use an object of it as standard
+        dependents = BaseContent.objects.filter(standard__in=own_urls.keys()).exclude(pk__in=paths.keys())
+        for id, standard_id in dependents.values_list("id", "standard"):
+            BaseContent.objects.filter(pk=id).update(absolute_url=own_urls[standard_id])
+
+    def update_tree_relations(self, is_new=False):
+        """Updates the tree index (see ContentTreeRelation) of the object and
+        its descendants. This is called on save.
+
+        **Parameters:**
+
+        is_new
+            True if the object has just been added.
+        """
+        if is_new:
+            subtree = []
+        else:
+            # Nothing to do if the parent hasn't been changed
+            parent_ids = list(ContentTreeRelation.objects.filter(descendant=self, depth=1).values_list("ancestor", flat=True))
+            if self.parent_id:
+                unchanged = parent_ids == [self.parent_id]
+            else:
+                unchanged = not parent_ids and ContentTreeRelation.objects.filter(ancestor=self, descendant=self).exists()
+            if unchanged:
+                return
+
+            # Detach the subtree from the old ancestors
+            subtree = list(ContentTreeRelation.objects.filter(ancestor=self).values_list("descendant", "depth"))
+            subtree_ids = [id for id, depth in subtree]
+            ContentTreeRelation.objects.filter(descendant__in=subtree_ids).exclude(ancestor__in=subtree_ids).delete()
+
+        relations = []
+        if not subtree:
+            subtree = [(self.id, 0)]
+            relations.append(ContentTreeRelation(ancestor_id=self.id, descendant_id=self.id, depth=0))
+
+        if self.parent_id:
+            ancestors = ContentTreeRelation.objects.filter(descendant=self.parent_id).values_list("ancestor", "depth")
+            for ancestor_id, ancestor_depth in ancestors:
+                for descendant_id, descendant_depth in subtree:
+                    relations.append(ContentTreeRelation(
+                        ancestor_id=ancestor_id, descendant_id=descendant_id, depth=ancestor_depth + descendant_depth + 1))
+
+        ContentTreeRelation.objects.bulk_create(relations)
+
+        if not is_new:
+            invalidate_permission_resolvers()
+
+    def _get_parent_data(self):
+        """Returns the slug path and the language of the parent object. Returns
+        (None, None) for top level objects.
+        """
+        if self.parent_id is None:
+            return (None, None)
+
+        # Don't use self.parent here, as it might be outdated after the
+        # parent_id has been changed, e.g. within cut and paste.
+        return BaseContent.objects.filter(pk=self.parent_id).values_list("slug_path", "language")[0]
 
     def add_history(self, request, action):
         """
@@ -704,16 +939,16 @@ class BaseContent(AbstractBaseContent):
         return AddForm(**kwargs)
 
     def get_ancestors(self):
-        """Returns all ancestors of a content object.
+        """Returns all ancestors of a content object, starting with the parent.
         """
-        ancestors = []
-        obj = self
-        while obj and obj.parent is not None:
-            temp = obj.parent.get_content_object()
-            ancestors.append(temp)
-            obj = obj.parent
+        ids = list(ContentTreeRelation.objects.filter(
+            descendant=self, depth__gt=0).order_by("depth").values_list("ancestor", flat=True))
 
-        return ancestors
+        objs = {}
+        for obj in BaseContent.objects.filter(pk__in=ids).get_content_objects():
+            objs[obj.id] = obj
+
+        return [objs[id] for id in ids if id in objs]
 
     def get_ancestors_reverse(self):
         """Returns all ancestors of the page in reverse order.
@@ -729,17 +964,40 @@ class BaseContent(AbstractBaseContent):
         return info.name
 
     def get_descendants(self, request=None, result=None):
-        """Returns all descendants of the content object. If the request is
-        passed the permissions of the current user is taken into account.
+        """Returns all descendants of the content object (depth-first, the
+        children of every object in its order). If the request is passed the
+        permissions of the current user is taken into account, i.e. objects
+        the user isn't allowed to see are left out together with their
+        descendants.
         """
         if result is None:
             result = []
-        for child in self.get_children(request):
-            result.append(child)
-            child.get_descendants(request, result)
 
+        descendants = BaseContent.objects.filter(
+            pk__in=ContentTreeRelation.objects.filter(ancestor=self, depth__gt=0).values("descendant"))
+        descendants = lfc.utils.filter_content_objects(request, descendants.get_content_objects())
+
+        children = {}
+        for obj in descendants:
+            children.setdefault(obj.parent_id, []).append(obj)
+
+        def _add_children(parent):
+            objs = children.get(parent.id, [])
+            if parent.order_by:
+                key = parent.order_by.lstrip("-")
+                objs.sort(key=lambda obj: getattr(obj, key), reverse=parent.order_by.startswith("-"))
+            for obj in objs:
+                result.append(obj)
+                _add_children(obj)
+
+        _add_children(self)
         return result
 
+    def is_descendant_of(self, obj):
+        """Returns True if the object is a descendant of passed object.
+        """
+        return ContentTreeRelation.objects.filter(ancestor=obj.id, descendant=self.id, depth__gt=0).exists()
+
     def has_children(self, request=None, *args, **kwargs):
         """Returns True if the object has children. If the request is
         passed the permissions of the current user is taken into account.
@@ -907,8 +1165,8 @@ class BaseContent(AbstractBaseContent):
 
         # Children
         # CACHE
-        children_cache_key = "%s-children-%s-%s-%s" % \
-            (settings.CACHE_MIDDLEWARE_KEY_PREFIX, self.content_type, self.id, request.user.id)
+        children_cache_key = lfc.utils.get_cache_key("children-%s-%s-%s" %
+            (self.content_type, self.id, get_permission_fingerprint(request.user)), [self])
         sub_objects = cache.get(children_cache_key)
         if sub_objects is None:
             # Get sub objects (as LOL if requested)
@@ -921,7 +1179,7 @@ class BaseContent(AbstractBaseContent):
 
         # Images
         # CACHE
-        images_cache_key = "%s-images-%s-%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, self.content_type, self.id)
+        images_cache_key = lfc.utils.get_cache_key("images-%s-%s" % (self.content_type, self.id), [self])
         cached_images = cache.get(images_cache_key)
         if cached_images:
             image = cached_images["image"]
@@ -966,22 +1224,39 @@ class BaseContent(AbstractBaseContent):
         """Renders the object content.
         """
         if self.context is None:
-            self.context = self.get_context()
+            self.context = self.get_context(request)
 
         # CACHE
-        template_cache_key = "%s-template-%s-%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, self.content_type, self.id)
+        template_cache_key = lfc.utils.get_cache_key("template-%s-%s" % (self.content_type, self.id), [self])
         obj_template = cache.get(template_cache_key)
         if obj_template is None:
             obj_template = self.get_template()
             cache.set(template_cache_key, obj_template)
 
-        tags = ""
-        for tag in getattr(settings, "LFC_TAGS", []):
-            tags += "{%% load %s %%}" % tag
+        # Tags within the template fields of the object and its children are
+        # rendered in advance, so that the page is rendered in one pass.
+        objs = [self]
+        for sub_object in self.context.get("sub_objects") or []:
+            if isinstance(sub_object, list):
+                objs.extend(sub_object)
+            else:
+                objs.append(sub_object)
+
+        originals = []
+        for obj in objs:
+            for name in obj.template_fields:
+                value = getattr(obj, name, None)
+                rendered = lfc.utils.render_text(value, self.context)
+                if rendered is not value:
+                    originals.append((obj, name, value))
+                    setattr(obj, name, rendered)
+
+        try:
+            result = render_to_string(obj_template.path, self.context)
+        finally:
+            for obj, name, value in originals:
+                setattr(obj, name, value)
 
-        # Render twice. This makes tags within text / short_text possible.
-        result = render_to_string(obj_template.path, self.context)
-        result = template.Template(tags + " " + result).render(self.context)
         return result
 
     # django-permissions
@@ -1000,20 +1275,7 @@ class BaseContent(AbstractBaseContent):
         except:
             pass
 
-        # Every user is also anonymous user
-        try:
-            roles = [Role.objects.get(name="Anonymous")]
-        except Role.DoesNotExist:
-            roles = []
-
-        # Check whether the current user is the creator of the current object.
-        try:
-            if user == self.creator:
-                roles.append(Role.objects.get(name="Owner"))
-        except (AttributeError, Role.DoesNotExist):
-            pass
-
-        result = super(BaseContent, self).has_permission(user, codename, roles)
+        result = get_permission_resolver(user).has_permission(self, codename)
 
         if not getattr(user, "permissions", False):
             user.permissions = {}
@@ -1056,6 +1318,7 @@ class BaseContent(AbstractBaseContent):
         """Reindexes the objects's searchable text.
         """
         self.searchable_text = self.get_searchable_text()
+        self._loaded_search = None
         self.save()
 
     def is_working_copy(self):
@@ -1100,6 +1363,52 @@ class BaseContent(AbstractBaseContent):
         return transitions
 
 
+def _join_slug_path(parent_path, slug):
+    """Returns the slug path for passed slug within the parent with passed
+    slug path. Returns an empty string if the slug path is too long to be
+    stored (the object is then found by walking the slugs).
+    """
+    if parent_path is None:
+        path = slug
+    elif parent_path == "":
+        return ""
+    else:
+        path = parent_path + "/" + slug
+
+    if len(path) > BaseContent._meta.get_field("slug_path").max_length:
+        return ""
+
+    return path
+
+
+def _calculate_url(slug_path, language, parent_language):
+    """Returns the URL (without the script prefix) of an object with passed
+    slug path and language. parent_language is the language of the parent
+    object or None for top level objects. Returns an empty string if the URL
+    depends on the current language or if it is too long to be stored.
+    """
+    if not slug_path:
+        return ""
+
+    if language == "0":
+        # Top level objects with neutral language are displayed in the
+        # current language.
+        if parent_language is None:
+            return ""
+        language = parent_language
+
+    if language in ("0", settings.LANGUAGE_CODE):
+        url = reverse("lfc_base_view", kwargs={"slug": slug_path})
+    else:
+        url = reverse("lfc_base_view", kwargs={"slug": slug_path, "language": language})
+
+    url = url[len(get_script_prefix()):]
+    if len(url) > BaseContent._meta.get_field("absolute_url").max_length:
+        return ""
+
+    return url
+
+
 class Image(models.Model):
     """An image which can be displayes within HTML. Generates automatically
     various sizes.
@@ -1134,7 +1443,7 @@ class Image(models.Model):
     content_id = models.PositiveIntegerField(_(u"Content id"), blank=True, null=True)
     content = generic.GenericForeignKey(ct_field="content_type", fk_field="content_id")
 
-    position = models.SmallIntegerField(_(u"Position"), default=999)
+    position = models.IntegerField(_(u"Position"), default=999)
     caption = models.CharField(_(u"Caption"), blank=True, max_length=100)
     description = models.TextField(_(u"Description"), blank=True)
     creation_date = models.DateTimeField(_(u"Creation date"), auto_now_add=True)
@@ -1182,7 +1491,7 @@ class File(models.Model):
     content_id = models.PositiveIntegerField(_(u"Content id"), blank=True, null=True)
     content = generic.GenericForeignKey(ct_field="content_type", fk_field="content_id")
 
-    position = models.SmallIntegerField(default=999)
+    position = models.IntegerField(default=999)
     description = models.TextField(blank=True)
     creation_date = models.DateTimeField(_(u"Creation date"), auto_now_add=True)
     file = models.FileField(upload_to="files")
@@ -1208,3 +1517,57 @@ class History(models.Model):
 
     class Meta:
         ordering = ("-creation_date", )
+
+
+class ContentTreeRelation(models.Model):
+    """Tree index of the content objects (closure table). There is one entry
+    for every ancestor of every content object (including the object itself),
+    so that all descendants or ancestors of an object can be get with one
+    query. This is maintained automatically on save.
+
+    **Attributes:**
+
+    ancestor
+        The ancestor object.
+
+    descendant
+        The descendant object.
+
+    depth
+        The distance between ancestor and descendant: 0 for the object
+        itself, 1 for the parent and so on.
+    """
+    ancestor = models.ForeignKey(BaseContent, verbose_name=_(u"Ancestor"), related_name="descendant_relations")
+    descendant = models.ForeignKey(BaseContent, verbose_name=_(u"Descendant"), related_name="ancestor_relations")
+    depth = models.PositiveIntegerField(_(u"Depth"))
+
+    class Meta:
+        unique_together = ["ancestor", "descendant"]
+
+
+class SearchIndex(models.Model):
+    """Inverted index of the searchable text of the content objects. There is
+    one entry for every term of every content object. This is maintained
+    automatically on save (see lfc.utils.search.IndexSearchBackend).
+
+    **Attributes:**
+
+    term
+        A term of the searchable text in lower case.
+
+    content
+        The content object which contains the term.
+
+    language
+        The language of the content object.
+
+    frequency
+        How often the term is contained within the searchable text.
+    """
+    term = models.CharField(_(u"Term"), max_length=50)
+    content = models.ForeignKey(BaseContent, verbose_name=_(u"Content"), related_name="search_terms")
+    language = models.CharField(_(u"Language"), max_length=10)
+    frequency = models.PositiveIntegerField(_(u"Frequency"), default=1)
+
+    class Meta:
+        index_together = ["term", "language"]
@@ -34,3 +34,8 @@ ORDER_BY_CHOICES = (
 
 IMAGE_SIZES = getattr(settings, 'LFC_IMAGE_SIZES', ((60, 60), (100, 100), (200, 200), (400, 400), (600, 600), (800, 800)))
 UPLOAD_FOLDER  = getattr(settings, 'LFC_UPLOAD_FOLDER', 'uploads')
+
+# The distance between the positions of neighbouring objects after they
+# have been renumbered. Moves are made within the gaps, see
+# lfc.utils.move_position.
+POSITION_GAP = getattr(settings, 'LFC_POSITION_GAP', 1000)
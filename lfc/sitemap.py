@@ -15,8 +15,8 @@ class PageSitemap(Sitemap):
     def items(self):
         anon = AnonymousUser()
         objects = []
-        for obj in BaseContent.objects.all():
-            if obj.get_content_object().has_permission(anon, "view"):
+        for obj in BaseContent.objects.all().get_content_objects():
+            if obj.has_permission(anon, "view"):
                 objects.append(obj)
 
         return objects
@@ -1,3 +1,6 @@
+# python imports
+import datetime
+
 # django import
 from django import template
 from django.conf import settings
@@ -17,6 +20,9 @@ from django.utils.translation import ugettext_lazy as _
 # lfc imports
 import lfc.utils
 from lfc.utils import registration
+from lfc.utils.resolver import get_permission_fingerprint
+from lfc.utils.tree import filter_nodes
+from lfc.utils.tree import get_tree
 
 register = template.Library()
 
@@ -59,15 +65,13 @@ class LanguagesNode(Node):
         lfc_context = context.get("lfc_context")
         request = context.get("request")
 
-        # CACHE
+        # CACHE. The translations invalidate the object, see
+        # BaseContent.invalidate_cache.
         if lfc_context:
-            cache_key = "%s-languages-%s-%s" % \
-                                          (settings.CACHE_MIDDLEWARE_KEY_PREFIX,
-                                           lfc_context.id, request.user.id)
+            cache_key = lfc.utils.get_cache_key("languages-%s-%s" % (lfc_context.id,
+                                                get_permission_fingerprint(request.user)), [lfc_context])
         else:
-            cache_key = "%s-languages-none-%s" % \
-                                          (settings.CACHE_MIDDLEWARE_KEY_PREFIX,
-                                           request.user.id)
+            cache_key = lfc.utils.get_cache_key("languages-none")
 
         languages = cache.get(cache_key)
 
@@ -87,8 +91,8 @@ class LanguagesNode(Node):
                     "is_available": is_available,
                 })
 
-        # Set cache
-        cache.set(cache_key, languages)
+            # Set cache
+            cache.set(cache_key, languages)
 
         context["lfc_languages"] = languages
         return ''
@@ -116,36 +120,29 @@ def tabs(context):
 
     lfc_context = context.get("lfc_context")
 
-    # CACHE
+    # CACHE. The tabs are the top level objects (slug path ""), which are
+    # marked if they are an ancestor of the current object.
     if lfc_context:
-        cache_key = "%s-tabs-%s-%s-%s-%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX,
-                                             lfc_context.content_type,
-                                             lfc_context.id, request.user.id,
-                                             language)
+        cache_key = lfc.utils.get_cache_key("tabs-%s-%s-%s-%s" % (lfc_context.content_type,
+                                                                  lfc_context.id,
+                                                                  get_permission_fingerprint(request.user),
+                                                                  language), ["", lfc_context])
     else:
-        cache_key = "%s-tabs-portal-%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX,
-                                           language)
+        cache_key = lfc.utils.get_cache_key("tabs-portal-%s" % language, [""])
 
     tabs = cache.get(cache_key)
 
     if tabs is None:
-        tl_objs = lfc.utils.get_content_objects(
-            request,
-            language__in=(language, "0"),
-            parent=None,
-            exclude_from_navigation=False,
-        )
-
-        if lfc_context is None:
-            current_pages = []
-        else:
-            current_pages = [lfc_context]
-            current_pages.extend(lfc_context.get_ancestors())
+        tree = get_tree()
+        tl_nodes = filter_nodes(request, [node for node in tree.get_children()
+            if node.language in (language, "0") and not node.exclude_from_navigation])
+
+        current_ids = _get_current_ids(tree, lfc_context)
 
-        tabs = []
-        for obj in tl_objs:
-            obj.current = obj in current_pages
-            tabs.append(obj)
+        # The templates get the content objects, the nodes only select them.
+        tabs = _get_content_objects(tl_nodes)
+        for obj in tabs:
+            obj.current = obj.id in current_ids
 
         cache.set(cache_key, tabs)
 
@@ -166,81 +163,100 @@ def navigation(context, start_level=1, expand_level=0):
 
     language = translation.get_language()
 
-    temp = lfc.utils.get_content_objects(request,
-        parent=None,
-        language__in=(language, "0"),
-        exclude_from_navigation=False)
+    # CACHE. The navigation depends on the current object, the visible objects
+    # and the navigation fields of all objects (see BaseContent.save).
+    if obj is None:
+        current = "none"
+        names = ["navigation", "standard"]
+    else:
+        current = "%s-%s" % (obj.__class__.__name__.lower(), obj.id)
+        names = ["navigation"]
+
+    cache_key = lfc.utils.get_cache_key("navigation-%s-%s-%s-%s-%s" % (
+        current, get_permission_fingerprint(request.user), language, start_level, expand_level), names=names)
+
+    objs = cache.get(cache_key)
+    if objs is None:
+        objs = _navigation(request, obj, language, start_level, expand_level)
+
+        # The navigation changes as soon as the next start or end date passes.
+        next_date = lfc.utils.get_active_dates()[1]
+        if next_date:
+            timeout = max(1, int((next_date - datetime.datetime.now()).total_seconds()))
+            cache.set(cache_key, objs, timeout)
+        else:
+            cache.set(cache_key, objs)
+
+    return {
+        "objs": objs,
+        "level": 1,
+        "show_level": start_level == 1,
+    }
 
-    # Add portal's standard to current_objs
+
+def _navigation(request, obj, language, start_level, expand_level):
+    """Returns the top level objects of the navigation tree with the rendered
+    children of the current objects.
+    """
+    tree = get_tree()
+
+    # Add portal's standard to current ids
     if obj is None:
-        current_objs = []
+        current_ids = set()
         standard = lfc.utils.get_portal().standard
         if standard:
             if language != standard.language:
                 standard = standard.get_translation(request, language)
             if standard:
-                current_objs.append(standard.get_content_object())
+                current_ids.add(standard.id)
     else:
-        current_objs = [obj]
-        try:
-            current_objs.extend(obj.get_ancestors())
-        except AttributeError:
-            pass
+        current_ids = _get_current_ids(tree, obj)
 
     objs = []
-    for obj in temp:
-        if obj in current_objs:
-            children = _navigation_children(request, current_objs, obj, start_level, expand_level)
+    for node in _get_navigation_nodes(request, tree, None, language):
+        if node.id in current_ids:
+            children = _navigation_children(request, tree, current_ids, node, start_level, expand_level)
             is_current = True
         elif expand_level >= 1 and start_level <= 1:
-            children = _navigation_children(request, current_objs, obj, start_level, expand_level)
+            children = _navigation_children(request, tree, current_ids, node, start_level, expand_level)
             is_current = False
         else:
             children = ""
             is_current = False
 
         objs.append({
-            "id": obj.id,
-            "slug": obj.slug,
-            "title": obj.title,
-            "url": obj.get_absolute_url(),
+            "id": node.id,
+            "slug": node.slug,
+            "title": node.title,
+            "url": node.get_absolute_url(),
             "is_current": is_current,
             "children": children,
             "level": 1
         })
 
-    return {
-        "objs": objs,
-        "level": 1,
-        "show_level": start_level == 1,
-    }
+    return objs
 
 
-def _navigation_children(request, current_objs, obj, start_level, expand_level, level=2):
-    """Renders the children of given object as sub navigation tree.
+def _navigation_children(request, tree, current_ids, node, start_level, expand_level, level=2):
+    """Renders the children of given node as sub navigation tree.
     """
-    obj = obj
-    temp = obj.get_children(request, exclude_from_navigation=False,
-        language__in=(translation.get_language(), "0"),
-    )
-
     objs = []
-    for obj in temp:
-        if obj in current_objs:
-            children = _navigation_children(request, current_objs, obj, start_level, expand_level, level=level + 1)
+    for node in _get_navigation_nodes(request, tree, node, translation.get_language()):
+        if node.id in current_ids:
+            children = _navigation_children(request, tree, current_ids, node, start_level, expand_level, level=level + 1)
             is_current = True
         elif level <= expand_level and level >= start_level:
-            children = _navigation_children(request, current_objs, obj, start_level, expand_level, level=level + 1)
+            children = _navigation_children(request, tree, current_ids, node, start_level, expand_level, level=level + 1)
             is_current = False
         else:
             children = ""
             is_current = False
 
         objs.append({
-            "id": obj.id,
-            "slug": obj.slug,
-            "title": obj.title,
-            "url": obj.get_absolute_url(),
+            "id": node.id,
+            "slug": node.slug,
+            "title": node.title,
+            "url": node.get_absolute_url(),
             "is_current": is_current,
             "children": children,
             "level": level,
@@ -255,6 +271,38 @@ def _navigation_children(request, current_objs, obj, start_level, expand_level,
     return result
 
 
+def _get_navigation_nodes(request, tree, node, language):
+    """Returns the children of passed node (or the top level nodes if node is
+    None) which are displayed within the navigation.
+    """
+    return filter_nodes(request, [child for child in tree.get_children(node)
+        if child.language in (language, "0") and not child.exclude_from_navigation])
+
+
+def _get_current_ids(tree, obj):
+    """Returns the ids of passed object and all its ancestors.
+    """
+    if not isinstance(obj, lfc.models.BaseContent):
+        return set()
+
+    current_ids = set([obj.id])
+    node = tree.get_node(obj.id)
+    if node is not None:
+        current_ids.update([ancestor.id for ancestor in tree.get_ancestors(node)])
+
+    return current_ids
+
+
+def _get_content_objects(nodes):
+    """Returns the specific content objects of passed tree nodes (see
+    lfc.utils.tree) in the order of the nodes, with one query per content
+    type.
+    """
+    objs = lfc.models.BaseContent.objects.filter(pk__in=[node.id for node in nodes]).get_content_objects()
+    objs = dict([(obj.id, obj) for obj in objs])
+    return [objs[node.id] for node in nodes if node.id in objs]
+
+
 @register.inclusion_tag('lfc/tags/breadcrumbs.html', takes_context=True)
 def breadcrumbs(context):
     """Displays breadcrumbs.
@@ -266,12 +314,18 @@ def breadcrumbs(context):
             "objs": []
         }
 
-    objs = []
-
-    temp = obj
-    while temp is not None:
-        objs.insert(0, temp)
-        temp = temp.parent
+    tree = get_tree()
+    node = tree.get_node(obj.id)
+    if node is None:
+        objs = []
+        temp = obj
+        while temp is not None:
+            objs.insert(0, temp)
+            temp = temp.parent
+    else:
+        ancestors = tree.get_ancestors(node)
+        ancestors.reverse()
+        objs = _get_content_objects(ancestors) + [obj]
 
     return {
         "obj": obj,
@@ -304,12 +358,8 @@ def objects_by_slug(context, slug, limit=5, title=True, text=False):
 
     objs = obj.children.all().order_by("-publication_date")[:limit]
 
-    result = []
-    for obj in objs:
-        result.append(obj.get_content_object())
-
     return {
-        "objs": result,
+        "objs": objs.get_content_objects(),
         "title": title,
         "text": text,
     }
@@ -319,7 +369,7 @@ def objects_by_slug(context, slug, limit=5, title=True, text=False):
 def previous_next_by_publication_date(obj):
     """Displays previous/links by creation date for the given object.
     """
-    siblings = [o.get_content_object() for o in obj.parent.children.all().order_by("-publication_date")]
+    siblings = obj.parent.children.all().order_by("-publication_date").get_content_objects()
     current_position = siblings.index(obj)
     next_position = current_position + 1
     previous_position = current_position - 1
@@ -366,7 +416,7 @@ def previous_next_by_creation_date(obj):
 def previous_next_by_position(context, obj):
     """Displays previous/links by position for the given object.
     """
-    siblings = [o.get_content_object() for o in obj.parent.children.all()]
+    siblings = obj.parent.children.all().get_content_objects()
     current_position = siblings.index(obj)
     next_position = current_position + 1
     previous_position = current_position - 1
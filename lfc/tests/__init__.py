@@ -7,6 +7,7 @@ from permission_tests import *
 from portal_tests import *
 from portlets_tests import *
 from registration_tests import *
+from search_tests import *
 from utils_tests import *
 from working_copy_tests import *
 
@@ -1,13 +1,19 @@
 # django imports
+from django.core.files.base import ContentFile
 from django.core.urlresolvers import reverse
 from django.test import TestCase
 from django.test.client import Client
 
 # lfc imports
+import lfc.utils.copier
 import lfc.utils.registration
 from lfc.utils import import_module
 from lfc.models import Application
+from lfc.models import BaseContent
+from lfc.models import ContentTreeRelation
+from lfc.models import File
 from lfc.models import Portal
+from lfc.utils.copier import copy_object
 
 # lfc_page imports
 from lfc_page.models import Page
@@ -168,3 +174,76 @@ class CopyTestCase(TestCase):
 
         # P1 has still one children
         self.assertEqual(len(self.p1.get_children()), 1)
+
+    def test_copy_object(self):
+        """Tests the copy engine directly.
+        """
+        self.p1.standard = self.p11
+        self.p1.save()
+        p1de = Page.objects.create(title="Seite 1", slug="page-1", language="de", canonical=self.p1)
+
+        new = copy_object(self.p1, self.p2.id, "page-1", 1000)
+        new_p11 = new.children.all()[0]
+
+        # References within the subtree point to the copies
+        self.assertEqual(new.parent_id, self.p2.id)
+        self.assertEqual(new.standard_id, new_p11.id)
+        self.assertEqual(new_p11.slug_path, "page-2/page-1/page-1-1")
+        self.assertEqual(new.get_absolute_url(), new_p11.get_absolute_url())
+        self.failUnless(ContentTreeRelation.objects.filter(ancestor=self.p2.id, descendant=new_p11.id, depth=2).exists())
+
+        # Translations are copied beside the originals
+        new_p1de = BaseContent.objects.get(canonical=new)
+        self.assertEqual(new_p1de.parent, None)
+        self.assertEqual(new_p1de.slug, "page-1-1")
+        self.assertEqual(new_p1de.language, "de")
+
+        # The originals are untouched
+        self.assertEqual(BaseContent.objects.get(pk=p1de.id).canonical_id, self.p1.id)
+        self.assertEqual(self.p1.children.count(), 1)
+
+    def test_copy_object_save(self):
+        """Tests that the save methods of sub classes are called for copies.
+        """
+        saved = []
+        save = Page.save
+
+        def page_save(obj, *args, **kwargs):
+            saved.append(obj.slug)
+            save(obj, *args, **kwargs)
+
+        Page.save = page_save
+        try:
+            new = copy_object(self.p1, self.p2.id, "page-1", 1000)
+        finally:
+            Page.save = save
+
+        self.assertEqual(saved, ["page-1", "page-1-1"])
+
+        # The bookkeeping of BaseContent is done by the copy engine
+        new = BaseContent.objects.get(pk=new.id)
+        self.assertEqual(new.slug_path, "page-2/page-1")
+        self.failUnless(ContentTreeRelation.objects.filter(ancestor=self.p2.id, descendant=new.id, depth=1).exists())
+
+    def test_copy_object_failure(self):
+        """Tests that copied files are deleted if the copying fails.
+        """
+        file = File(content=self.p1, title="test.txt")
+        file.file.save("test.txt", ContentFile("0123456789"))
+        names = file.file.storage.listdir("files")[1]
+
+        def get_search_backend():
+            raise ValueError("Hurz")
+
+        original = lfc.utils.copier.get_search_backend
+        lfc.utils.copier.get_search_backend = get_search_backend
+        try:
+            self.assertRaises(ValueError, copy_object, self.p1, self.p2.id, "page-1", 1000)
+        finally:
+            lfc.utils.copier.get_search_backend = original
+
+        try:
+            self.assertEqual(self.p2.children.count(), 0)
+            self.assertEqual(file.file.storage.listdir("files")[1], names)
+        finally:
+            file.file.delete()
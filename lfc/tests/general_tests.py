@@ -1,17 +1,40 @@
+# python imports
+from StringIO import StringIO
+
+# PIL imports
+import PIL.Image
+
 # django imports
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.urlresolvers import reverse
+from django.template import Context
 from django.test import TestCase
+from django.test.utils import override_settings
 from django.utils import translation
 
 # permissions imports
 import permissions.utils
 
 # lfc imports
+from lfc.fields.thumbs import generate_thumbs
+from lfc.fields.thumbs import get_thumb_name
+from lfc.fields.thumbs import set_thumb_stored
+from lfc.fields.thumbs import wait_for_thumbnails
 from lfc.models import Application
+from lfc.models import File
+from lfc.models import Image
 from lfc.models import Portal
 from lfc.tests.utils import create_request
 from lfc.utils import import_module
+from lfc.utils import clear_cache
 from lfc.utils import delete_cache
 from lfc.utils import get_cache
+from lfc.utils import get_cache_key
+from lfc.utils import get_portal
+from lfc.utils import invalidate_cache
+from lfc.utils import invalidate_subtree
+from lfc.utils import render_text
 from lfc.utils import set_cache
 
 # lfc_page imports
@@ -74,8 +97,9 @@ class GeneralTestCase(TestCase):
         temp = get_cache(["1", "2", "3", "5"])
         self.assertEqual(temp, u"hurz_4")
 
+        # Keys are flat, there are no values for leading keys
         temp = get_cache(["1", "2", "3"])
-        self.assertEqual(temp, {'5': u'hurz_4', '4': u'hurz_3'})
+        self.assertEqual(temp, None)
 
     def test_cache_2(self):
         """
@@ -96,6 +120,211 @@ class GeneralTestCase(TestCase):
         """
         """
         set_cache(["1", "2", "3", "4"], u"hurz_3")
+        set_cache(["1", "2", "5"], u"hurz_4")
         delete_cache(["1", "2", "3"])
-        temp = get_cache(["1", "2"])
-        self.assertEqual(temp, {})
+        self.assertEqual(get_cache(["1", "2", "3", "4"]), None)
+        self.assertEqual(get_cache(["1", "2", "5"]), u"hurz_4")
+
+        delete_cache(["1", "2", "5"])
+        self.assertEqual(get_cache(["1", "2", "5"]), None)
+
+    def test_cache_4(self):
+        """
+        """
+        # The size of the key is bounded
+        set_cache(["a" * 1000, 1], u"hurz_1")
+        self.assertEqual(get_cache(["a" * 1000, 1]), u"hurz_1")
+        self.assertEqual(get_cache(["a" * 1000, 2]), None)
+
+    def test_cache_key(self):
+        """
+        """
+        p11 = Page.objects.create(title="Page 1-1", slug="page-1-1", parent=self.p1)
+        p2 = Page.objects.create(title="Page 2", slug="page-2")
+
+        key_1 = get_cache_key("key", [self.p1])
+        key_11 = get_cache_key("key", [p11])
+        key_2 = get_cache_key("key", [p2])
+        self.assertEqual(get_cache_key("key", [self.p1]), key_1)
+
+        # Invalidating an object changes only its own keys
+        invalidate_cache([p11])
+        self.assertEqual(get_cache_key("key", [self.p1]), key_1)
+        self.assertNotEqual(get_cache_key("key", [p11]), key_11)
+        key_11 = get_cache_key("key", [p11])
+
+        # Invalidating a subtree changes the keys of all objects within it
+        invalidate_subtree(self.p1)
+        self.assertNotEqual(get_cache_key("key", [self.p1]), key_1)
+        self.assertNotEqual(get_cache_key("key", [p11]), key_11)
+        self.assertEqual(get_cache_key("key", [p2]), key_2)
+
+        # Clearing changes all keys, but doesn't flush the cache
+        cache.set("independent", u"hurz")
+        clear_cache()
+        self.assertNotEqual(get_cache_key("key", [p2]), key_2)
+        self.assertEqual(cache.get("independent"), u"hurz")
+
+    def test_portal_cache(self):
+        """
+        """
+        portal = get_portal()
+        portal.title = "Hurz"
+        self.assertNotEqual(get_portal().title, "Hurz")
+
+        # Saving the portal invalidates the cached one
+        portal.save()
+        self.assertEqual(get_portal().title, "Hurz")
+
+    def test_render_text(self):
+        """
+        """
+        context = Context({"title": "Hurz"})
+
+        # Texts without template syntax are returned unchanged
+        text = "<p>Lorem ipsum</p>"
+        self.failUnless(render_text(text, context) is text)
+        self.assertEqual(render_text("", context), "")
+        self.assertEqual(render_text(None, context), None)
+
+        self.assertEqual(render_text("<p>{{ title }}</p>", context), "<p>Hurz</p>")
+        self.assertEqual(render_text("<p>{% if title %}Yes{% endif %}</p>", context), "<p>Yes</p>")
+
+        # The compiled template is reused
+        self.assertEqual(render_text("<p>{{ title }}</p>", Context({"title": "Hurz 2"})), "<p>Hurz 2</p>")
+
+    @override_settings(LFC_LAZY_THUMBNAILS=True)
+    def test_lazy_thumbnails(self):
+        """
+        """
+        io = StringIO()
+        PIL.Image.new("RGB", (300, 200)).save(io, "JPEG")
+
+        image = Image(title="Image")
+        image.image.save("test-image.jpg", ContentFile(io.getvalue()))
+
+        try:
+            # The thumbnail doesn't exist yet
+            thumb_name = get_thumb_name(image.image.name, (60, 60))
+            self.failIf(image.image.storage.exists(thumb_name))
+            url = image.image.url_60x60
+            self.assertEqual(url, reverse("lfc_thumbnail", kwargs={"width": 60, "height": 60, "name": image.image.name}))
+
+            # It is generated on the first request
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 302)
+            self.failUnless(image.image.storage.exists(thumb_name))
+            self.failUnless(response["Location"].endswith(image.image.storage.url(thumb_name)))
+
+            # Afterwards it is served statically
+            self.assertNotEqual(image.image.url_60x60, url)
+            self.assertEqual(image.image.url_60x60, image.image.storage.url(thumb_name))
+
+            # Deleted thumbnails are generated again
+            image.image.storage.delete(thumb_name)
+            set_thumb_stored(image.image.name, (60, 60), False)
+            self.assertEqual(image.image.url_60x60, url)
+
+            # Unknown sizes are not generated
+            response = self.client.get(reverse("lfc_thumbnail", kwargs={"width": 61, "height": 61, "name": image.image.name}))
+            self.assertEqual(response.status_code, 404)
+        finally:
+            image.image.delete()
+
+    def test_generate_thumbs(self):
+        """
+        """
+        io = StringIO()
+        PIL.Image.new("RGB", (1600, 800)).save(io, "JPEG")
+
+        thumbs = generate_thumbs(io, ((100, 100), (800, 800), (400, 100), (60, 60)), "jpg")
+        sizes = [(size, PIL.Image.open(content).size) for size, content in thumbs]
+
+        # Largest first, every thumbnail fits into its size
+        self.assertEqual(sizes, [
+            ((800, 800), (800, 400)),
+            ((400, 100), (200, 100)),
+            ((100, 100), (100, 50)),
+            ((60, 60), (60, 30)),
+        ])
+
+    @override_settings(LFC_THUMBNAIL_WORKERS=2)
+    def test_thumbnail_pool(self):
+        """
+        """
+        io = StringIO()
+        PIL.Image.new("RGB", (300, 200)).save(io, "JPEG")
+
+        images = []
+        try:
+            # Thumbnails are generated synchronously, unless requested
+            image = Image(title="Image")
+            image.image.save("test-image.jpg", ContentFile(io.getvalue()))
+            images.append(image)
+            for size in image.image.sizes:
+                self.failUnless(image.image.storage.exists(get_thumb_name(image.image.name, size)))
+
+            for i in range(3):
+                image = Image(title="Image %s" % i)
+                image.image.save("test-image.jpg", ContentFile(io.getvalue()), background=True)
+                images.append(image)
+
+            wait_for_thumbnails()
+
+            for image in images:
+                for size in image.image.sizes:
+                    self.failUnless(image.image.storage.exists(get_thumb_name(image.image.name, size)))
+        finally:
+            for image in images:
+                image.image.delete()
+
+    def test_file(self):
+        """
+        """
+        file = File(title="test.txt")
+        file.file.save("test.txt", ContentFile("0123456789"))
+
+        try:
+            url = reverse("lfc_file", kwargs={"id": file.id})
+
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response["Content-Length"], "10")
+            self.assertEqual("".join(response.streaming_content), "0123456789")
+
+            # Ranges
+            response = self.client.get(url, HTTP_RANGE="bytes=2-4")
+            self.assertEqual(response.status_code, 206)
+            self.assertEqual(response["Content-Range"], "bytes 2-4/10")
+            self.assertEqual("".join(response.streaming_content), "234")
+
+            response = self.client.get(url, HTTP_RANGE="bytes=-3")
+            self.assertEqual("".join(response.streaming_content), "789")
+
+            response = self.client.get(url, HTTP_RANGE="bytes=10-")
+            self.assertEqual(response.status_code, 416)
+
+            response = self.client.get(url, HTTP_RANGE="bytes=-0")
+            self.assertEqual(response.status_code, 416)
+
+            # Outdated ranges get the whole file
+            response = self.client.get(url, HTTP_RANGE="bytes=2-4", HTTP_IF_RANGE='"outdated"')
+            self.assertEqual(response.status_code, 200)
+
+            # Weak ETags never match
+            etag = response["ETag"]
+            response = self.client.get(url, HTTP_RANGE="bytes=2-4", HTTP_IF_RANGE="W/" + etag)
+            self.assertEqual(response.status_code, 200)
+
+            response = self.client.get(url, HTTP_RANGE="bytes=2-4", HTTP_IF_RANGE=etag)
+            self.assertEqual(response.status_code, 206)
+
+            # Conditional GET
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+            self.assertEqual(response.status_code, 304)
+
+            with self.settings(LFC_FILE_SENDFILE="X-Accel-Redirect"):
+                response = self.client.get(url)
+                self.assertEqual(response["X-Accel-Redirect"], "/lfc-files/" + file.file.name)
+        finally:
+            file.file.delete()
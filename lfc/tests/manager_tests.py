@@ -44,3 +44,13 @@ class ManagerTestCase(TestCase):
         """
         obj = BaseContent.objects.filter(slug="page-1").get_content_objects()
         self.failUnless(isinstance(obj[0], Page))
+
+    def test_get_content_objects_order(self):
+        """
+        """
+        objs = BaseContent.objects.order_by("-slug").get_content_objects()
+        self.assertEqual(objs, [self.p2, self.p1])
+        self.failUnless(isinstance(objs[0], Page))
+
+        with self.assertNumQueries(2):
+            BaseContent.objects.all().get_content_objects()
@@ -1,6 +1,11 @@
 # django imports
 from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
 from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils import translation
+from django.utils.http import http_date
+from django.utils.http import quote_etag
 
 # permissions imports
 import permissions.utils
@@ -11,7 +16,16 @@ from lfc.utils import import_module
 from lfc.models import Application
 from lfc.models import BaseContent
 from lfc.models import Portal
+from lfc.manage.views import _update_positions
+from lfc.templatetags.lfc_tags import breadcrumbs
+from lfc.templatetags.lfc_tags import navigation
+from lfc.templatetags.lfc_tags import tabs
 from lfc.tests.utils import create_request
+from lfc.utils.tree import filter_nodes
+from lfc.utils.tree import get_tree
+from lfc.views import _get_not_modified_response
+from lfc.views import _get_page_cache_key
+from lfc.views import _get_page_validators
 
 # lfc_page imports
 from lfc_page.forms import PageDataForm
@@ -89,6 +103,34 @@ class PageTestCase(TestCase):
         url = self.p11.get_absolute_url()
         self.assertEqual(url, "/page-1/page-1-1")
 
+    def test_get_absolute_url_stored(self):
+        """The URL is precomputed and kept in sync with the tree.
+        """
+        self.p1.language = settings.LANGUAGE_CODE
+        self.p1.save()
+
+        # Neutral children of the page get the language of the page
+        p111 = Page.objects.get(pk=self.p111.id)
+        self.assertEqual(p111.absolute_url, "page-1/page-1-1/page-1-1-1")
+
+        # Move page 1-1 to page 2 (en)
+        self.p11.parent = self.p2en
+        self.p11.save()
+
+        p111 = Page.objects.get(pk=self.p111.id)
+        self.assertEqual(p111.get_absolute_url(), self.p2en.get_absolute_url() + "/page-1-1/page-1-1-1")
+
+        # Page 1-2 is the standard of page 1
+        self.p1.standard = self.p12
+        self.p1.save()
+        self.assertEqual(self.p1.get_absolute_url(), "/page-1/page-1-2")
+
+        self.p12.slug = "page-x"
+        self.p12.save()
+
+        p1 = Page.objects.get(pk=self.p1.id)
+        self.assertEqual(p1.get_absolute_url(), "/page-1/page-x")
+
     def test_get_content_object(self):
         """
         """
@@ -221,6 +263,21 @@ class PageTestCase(TestCase):
         self.assertEqual(len(descendants), 1)
         self.failUnless(self.p111 in descendants)
 
+    def test_get_descendants_after_move(self):
+        """
+        """
+        self.assertEqual(self.p1.get_descendants(), [self.p11, self.p111, self.p12])
+        self.failUnless(self.p111.is_descendant_of(self.p1))
+
+        # Move page 1-1 to page 2 (en)
+        self.p11.parent = self.p2en
+        self.p11.save()
+
+        self.assertEqual(self.p1.get_descendants(), [self.p12])
+        self.assertEqual(self.p2en.get_descendants(), [self.p11, self.p111])
+        self.failIf(self.p111.is_descendant_of(self.p1))
+        self.assertEqual(self.p111.get_ancestors(), [self.p11, self.p2en])
+
     def test_get_children(self):
         """
         """
@@ -325,3 +382,223 @@ class PageTestCase(TestCase):
                          '/fr/page-2')
         self.assertEqual(set_language(request, 'en', self.p2en.id)['Location'],
                          '/page-2')
+
+    def test_page_cache_key(self):
+        """
+        """
+        request = create_request()
+
+        # Disabled by default
+        request.user = AnonymousUser()
+        self.assertEqual(_get_page_cache_key(request, "page-1/page-1-1"), None)
+
+        with override_settings(LFC_ANONYMOUS_PAGE_CACHE=True):
+            key_1 = _get_page_cache_key(request, "page-1")
+            key_11 = _get_page_cache_key(request, "page-1/page-1-1")
+            key_2 = _get_page_cache_key(request, "page-2")
+            self.failIf(key_11 is None)
+            self.assertEqual(_get_page_cache_key(request, "page-1/page-1-1"), key_11)
+
+            # Changing an object invalidates its page and the one of its parent
+            # (which lists it as child) and of its descendants.
+            self.p1.description = "Hurz"
+            self.p1.save()
+            self.assertNotEqual(_get_page_cache_key(request, "page-1"), key_1)
+            self.assertNotEqual(_get_page_cache_key(request, "page-1/page-1-1"), key_11)
+            self.assertEqual(_get_page_cache_key(request, "page-2"), key_2)
+
+            # Changing the navigation invalidates all pages
+            key_11 = _get_page_cache_key(request, "page-1/page-1-1")
+            self.p2en.title = "Hurz"
+            self.p2en.save()
+            self.assertNotEqual(_get_page_cache_key(request, "page-1/page-1-1"), key_11)
+
+            # Only anonymous users without messages get cached pages
+            request.COOKIES["message"] = "Hurz"
+            self.assertEqual(_get_page_cache_key(request, "page-1"), None)
+
+            del request.COOKIES["message"]
+            request.user = create_request().user
+            self.assertEqual(_get_page_cache_key(request, "page-1"), None)
+
+    def test_page_validators(self):
+        """
+        """
+        request = create_request()
+        request.user = AnonymousUser()
+
+        validators = _get_page_validators(request, self.p11, "page-1/page-1-1")
+        self.assertEqual(_get_page_validators(request, self.p11, "page-1/page-1-1"), validators)
+
+        response = _get_not_modified_response(request, validators)
+        self.assertEqual(response, None)
+
+        # The browser's version is still valid
+        request.META["HTTP_IF_NONE_MATCH"] = quote_etag(validators["etag"])
+        response = _get_not_modified_response(request, validators)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], quote_etag(validators["etag"]))
+        self.failUnless("public" in response["Cache-Control"])
+
+        del request.META["HTTP_IF_NONE_MATCH"]
+        request.META["HTTP_IF_MODIFIED_SINCE"] = http_date(validators["last_modified"])
+        response = _get_not_modified_response(request, validators)
+        self.assertEqual(response.status_code, 304)
+
+        # Changing the parent changes the validators
+        self.p1.description = "Hurz"
+        self.p1.save()
+        self.assertNotEqual(_get_page_validators(request, self.p11, "page-1/page-1-1")["etag"], validators["etag"])
+
+        # After a login the page isn't valid anymore just because it hasn't
+        # been modified; the ETag contains the user.
+        request.user = create_request().user
+        self.assertEqual(_get_not_modified_response(request, validators), None)
+
+        # Authenticated users get private pages
+        validators = _get_page_validators(request, self.p11, "page-1/page-1-1")
+        request.META["HTTP_IF_NONE_MATCH"] = quote_etag(validators["etag"])
+        response = _get_not_modified_response(request, validators)
+        self.failUnless("private" in response["Cache-Control"])
+        self.failUnless("Cookie" in response["Vary"])
+
+        # Messages are always displayed
+        request.COOKIES["message"] = "Hurz"
+        self.assertEqual(_get_page_validators(request, self.p11, "page-1/page-1-1"), None)
+
+    def test_tabs_and_breadcrumbs(self):
+        """
+        """
+        request = create_request()
+        translation.activate("en")
+
+        # The templates get the content objects
+        result = tabs({"request": request, "LANGUAGE_CODE": "en", "lfc_context": self.p11})
+        self.assertEqual([obj.id for obj in result["tabs"]], [self.p1.id, self.p2en.id])
+        self.failUnless(isinstance(result["tabs"][0], Page))
+        self.assertEqual([obj.current for obj in result["tabs"]], [True, False])
+
+        result = breadcrumbs({"lfc_context": self.p111})
+        self.assertEqual([obj.id for obj in result["objs"]], [self.p1.id, self.p11.id, self.p111.id])
+        self.failUnless(all([isinstance(obj, Page) for obj in result["objs"]]))
+
+    def test_navigation_cache(self):
+        """
+        """
+        request = create_request()
+        request.META["lfc_context"] = self.p2en
+
+        translation.activate("en")
+        result = navigation({"request": request})
+        self.assertEqual([obj["title"] for obj in result["objs"]], ["Page 1", "Page 2 (en)"])
+        self.assertEqual([obj["is_current"] for obj in result["objs"]], [False, True])
+
+        # Changing the navigation invalidates the cached navigation
+        self.p1.title = "Hurz"
+        self.p1.save()
+
+        result = navigation({"request": request})
+        self.assertEqual([obj["title"] for obj in result["objs"]], ["Hurz", "Page 2 (en)"])
+
+    def test_tree(self):
+        """
+        """
+        tree = get_tree()
+        self.failUnless(get_tree() is tree)
+
+        node = tree.get_node(self.p11.id)
+        self.assertEqual(node.title, "Page 1-1")
+        self.assertEqual(node.get_absolute_url(), self.p11.get_absolute_url())
+        self.assertEqual([ancestor.id for ancestor in tree.get_ancestors(node)], [self.p1.id])
+        self.assertEqual([child.id for child in tree.get_children(tree.get_node(self.p1.id))],
+                         [self.p11.id, self.p12.id])
+        self.assertEqual([child.id for child in tree.get_children()],
+                         [self.p1.id, self.p2en.id, self.p2de.id, self.p2fr.id])
+
+        # The order of the parent is taken into account
+        self.p1.order_by = "-position"
+        self.p1.save()
+
+        tree = get_tree()
+        self.assertEqual([child.id for child in tree.get_children(tree.get_node(self.p1.id))],
+                         [self.p12.id, self.p11.id])
+
+        # A changed navigation reloads the tree
+        self.p11.title = "Hurz"
+        self.p11.save()
+        self.failIf(get_tree() is tree)
+        self.assertEqual(get_tree().get_node(self.p11.id).title, "Hurz")
+
+        # Nodes are filtered like content objects
+        request = create_request()
+        self.assertEqual(len(filter_nodes(request, get_tree().get_children())), 4)
+
+    def test_update_positions(self):
+        """
+        """
+        BaseContent.objects.filter(pk=self.p11.id).update(position=5)
+        BaseContent.objects.filter(pk=self.p12.id).update(position=3)
+        tree = get_tree()
+
+        obj = _update_positions(self.p11, True)
+        self.assertEqual(obj.position, 2000)
+        self.assertEqual(BaseContent.objects.get(pk=self.p12.id).position, 1000)
+        self.assertEqual(BaseContent.objects.get(pk=self.p11.id).position, 2000)
+
+        # The navigation is invalidated
+        tree = get_tree()
+        self.assertEqual([child.id for child in tree.get_children(tree.get_node(self.p1.id))],
+                         [self.p12.id, self.p11.id])
+
+        # Top level objects per language
+        _update_positions(None)
+        positions = BaseContent.objects.filter(pk__in=(self.p1.id, self.p2en.id)).values_list("position", flat=True)
+        self.assertEqual(sorted(positions), [1000, 2000])
+
+        # Gaps are kept, unless positions collide
+        BaseContent.objects.filter(pk=self.p11.id).update(position=1500)
+        _update_positions(self.p1, collisions_only=True)
+        self.assertEqual(BaseContent.objects.get(pk=self.p11.id).position, 1500)
+
+        BaseContent.objects.filter(pk=self.p11.id).update(position=1000)
+        _update_positions(self.p1, collisions_only=True)
+        positions = BaseContent.objects.filter(parent=self.p1).values_list("position", flat=True)
+        self.assertEqual(sorted(positions), [1000, 2000])
+
+    def test_move_position(self):
+        """
+        """
+        p13 = Page.objects.create(title="Page 1-3", slug="page-1-3", parent=self.p1)
+        _update_positions(self.p1)
+        siblings = BaseContent.objects.filter(parent=self.p1)
+
+        def get_order():
+            return list(siblings.order_by("position", "pk").values_list("id", flat=True))
+
+        # Only the moved object gets a new position
+        p13 = BaseContent.objects.get(pk=p13.id)
+        self.assertEqual(lfc.utils.move_position(p13, siblings, up=True), [])
+        self.assertEqual(p13.position, 1500)
+        p13.save()
+        self.assertEqual(get_order(), [self.p11.id, p13.id, self.p12.id])
+
+        p13 = BaseContent.objects.get(pk=p13.id)
+        lfc.utils.move_position(p13, siblings, up=True)
+        self.assertEqual(p13.position, 500)
+        p13.save()
+        self.assertEqual(get_order(), [p13.id, self.p11.id, self.p12.id])
+
+        # The first object stays first
+        self.assertEqual(lfc.utils.move_position(p13, siblings, up=True), [])
+        self.assertEqual(p13.position, 500)
+
+        # The siblings are renumbered if there is no gap left
+        BaseContent.objects.filter(pk=self.p11.id).update(position=501)
+        p12 = BaseContent.objects.get(pk=self.p12.id)
+        p12.position = 502
+        p12.save()
+        changed = lfc.utils.move_position(p12, siblings, up=True)
+        p12.save()
+        self.assertEqual(sorted(changed), sorted([p13.id, self.p11.id]))
+        self.assertEqual(get_order(), [p13.id, self.p12.id, self.p11.id])
+        self.assertEqual(list(siblings.order_by("position").values_list("position", flat=True)), [1000, 2000, 3000])
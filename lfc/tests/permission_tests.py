@@ -25,6 +25,8 @@ from portlets.models import Slot
 # lfc imports
 import lfc.utils.registration
 from lfc.models import Portal
+from lfc.utils.resolver import PermissionResolver
+from lfc.utils.resolver import get_permission_fingerprint
 from lfc.tests.utils import create_request
 
 # lfc_page imports
@@ -210,6 +212,55 @@ class LFCPermissionTestCase2(TestCase):
         roles = permissions.utils.get_roles(self.user, self.page_3)
         self.assertEqual(list(roles), [self.editor])
 
+    def test_permission_resolver(self):
+        """
+        """
+        permissions.utils.register_permission("View", "view")
+        permissions.utils.grant_permission(self.page_1, self.editor, "view")
+
+        resolver = PermissionResolver(self.user)
+        resolver.prefetch([self.page_1, self.page_2, self.page_3])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(resolver.has_permission(self.page_1, "view"), False)
+            self.assertEqual(resolver.has_permission(self.page_2, "view"), False)
+            self.assertEqual(resolver.has_permission(self.page_3, "view"), False)
+
+        # Local roles are inherited
+        permissions.utils.add_local_role(self.page_2, self.user, self.editor)
+
+        resolver = PermissionResolver(self.user)
+        resolver.prefetch([self.page_1, self.page_2, self.page_3])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(resolver.has_permission(self.page_1, "view"), False)
+            self.assertEqual(resolver.has_permission(self.page_2, "view"), True)
+            self.assertEqual(resolver.has_permission(self.page_3, "view"), True)
+
+        # Permissions are not inherited beyond blocks
+        permissions.utils.add_inheritance_block(self.page_3, "view")
+
+        self.assertEqual(self.page_2.has_permission(self.user, "view"), True)
+        self.assertEqual(self.page_3.has_permission(self.user, "view"), False)
+
+    def test_permission_fingerprint(self):
+        """
+        """
+        user_2 = User.objects.create(username="user-2", is_active=True)
+
+        # Users with the same roles share the fingerprint
+        self.assertEqual(get_permission_fingerprint(self.user), get_permission_fingerprint(user_2))
+
+        permissions.utils.add_local_role(self.page_2, self.user, self.editor)
+        self.assertNotEqual(get_permission_fingerprint(self.user), get_permission_fingerprint(user_2))
+
+        # Also if they get them by group
+        self.user.groups.add(self.group)
+        user_2.groups.add(self.group)
+        permissions.utils.remove_local_role(self.page_2, self.user, self.editor)
+        permissions.utils.add_local_role(self.page_2, self.group, self.editor)
+        self.assertEqual(get_permission_fingerprint(self.user), get_permission_fingerprint(user_2))
+
 
 class LFCPermissionTestCase(TestCase):
     """
@@ -0,0 +1,173 @@
+# django imports
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+from django.test.utils import override_settings
+
+# lfc imports
+from lfc.models import Application
+from lfc.models import BaseContent
+from lfc.models import Portal
+from lfc.models import SearchIndex
+from lfc.tests.utils import create_request
+from lfc.utils import import_module
+from lfc.utils.search import get_reindex_progress
+from lfc.utils.search import get_search_backend
+from lfc.utils.search import get_search_results
+from lfc.utils.search import get_terms
+from lfc.utils.search import reindex_objects
+
+# lfc_page imports
+from lfc_page.models import Page
+
+
+class SearchTestCase(TestCase):
+    """Tests the search index.
+    """
+    def setUp(self):
+        """
+        """
+        from lfc.utils.initialize import initialize
+        initialize()
+
+        import_module("lfc_page").install()
+        try:
+            Application.objects.create(name="lfc_page")
+        except Application.DoesNotExist:
+            pass
+
+        Portal.objects.create()
+        self.p1 = Page.objects.create(title="Lorem ipsum", slug="page-1", description="Lorem dolor")
+        self.p2 = Page.objects.create(title="Dolor sit amet", slug="page-2", language="de")
+        self.p3 = Page.objects.create(title="Lorem amet", slug="page-3", language="en")
+
+    def test_get_terms(self):
+        """
+        """
+        self.assertEqual(get_terms(u"Lorem ipsum, LOREM a dolor!"), {"lorem": 2, "ipsum": 1, "dolor": 1})
+        self.assertEqual(get_terms(""), {})
+
+    def test_index(self):
+        """
+        """
+        self.assertEqual(SearchIndex.objects.get(content=self.p1, term="lorem").frequency, 2)
+
+        # Changed objects are reindexed
+        self.p1.title = "Hurz"
+        self.p1.save()
+        self.failIf(SearchIndex.objects.filter(content=self.p1, term="ipsum").exists())
+        self.assertEqual(SearchIndex.objects.get(content=self.p1, term="lorem").frequency, 1)
+
+        # Excluded objects are not indexed
+        self.p1.exclude_from_search = True
+        self.p1.save()
+        self.failIf(SearchIndex.objects.filter(content=self.p1).exists())
+
+        # Deleted objects are removed
+        self.p2.delete()
+        self.failIf(SearchIndex.objects.filter(content_id=self.p2.id).exists())
+
+    def test_search(self):
+        """
+        """
+        backend = get_search_backend()
+
+        # Ranked by frequency
+        self.assertEqual(backend.search("lorem", "en"), [self.p1.id, self.p3.id])
+
+        # All terms have to match
+        self.assertEqual(backend.search("lorem amet", "en"), [self.p3.id])
+        self.assertEqual(backend.search("hurz", "en"), [])
+        self.assertEqual(backend.search("", "en"), [])
+
+        # Language
+        self.assertEqual(backend.search("dolor", "en"), [self.p1.id])
+        self.assertEqual(backend.search("dolor", "de"), [self.p1.id, self.p2.id])
+
+        # Prefix
+        self.assertEqual(backend.search("lor", "en"), [])
+        self.assertEqual(backend.search("lor", "en", prefix=True), [self.p1.id, self.p3.id])
+
+        # Slices
+        self.assertEqual(backend.search("lorem", "en", start=1), [self.p3.id])
+        self.assertEqual(backend.search("lorem", "en", limit=1), [self.p1.id])
+        self.assertEqual(backend.search("lorem", "en", start=2, limit=1), [])
+        self.assertEqual(backend.count("lorem", "en"), 2)
+        self.assertEqual(backend.count("lorem amet", "en"), 1)
+        self.assertEqual(backend.count("hurz", "en"), 0)
+
+        request = create_request()
+        results, total, next_start = get_search_results(request, "lorem", "en")
+        self.assertEqual([obj.id for obj in results], [self.p1.id, self.p3.id])
+        self.failUnless(isinstance(results[0], Page))
+        self.assertEqual(total, 2)
+        self.assertEqual(next_start, None)
+
+    def test_search_pages(self):
+        """
+        """
+        request = create_request()
+
+        results, total, next_start = get_search_results(request, "lorem", "en", limit=1)
+        self.assertEqual([obj.id for obj in results], [self.p1.id])
+        self.assertEqual(total, 2)
+        self.assertEqual(next_start, 1)
+
+        results, total, next_start = get_search_results(request, "lorem", "en", start=next_start, limit=1)
+        self.assertEqual([obj.id for obj in results], [self.p3.id])
+        self.assertEqual(next_start, None)
+
+        # Objects the user isn't allowed to view are skipped
+        request.user = AnonymousUser()
+        results, total, next_start = get_search_results(request, "lorem", "en", limit=1)
+        self.assertEqual(results, [])
+        self.assertEqual(total, 2)
+
+    def test_search_results_view(self):
+        """
+        """
+        # All results are displayed by default, the anonymous user isn't
+        # allowed to view any of them.
+        response = self.client.get(reverse("lfc_search"), {"q": "lorem"})
+        self.assertEqual(response.context["results"], [])
+        self.assertEqual(response.context["quantity"], 0)
+        self.assertEqual(response.context["next_start"], None)
+
+        # With paging the quantity is the number of matching objects
+        with self.settings(LFC_SEARCH_RESULTS_PER_PAGE=1):
+            response = self.client.get(reverse("lfc_search"), {"q": "lorem"})
+        self.assertEqual(response.context["results"], [])
+        self.assertEqual(response.context["quantity"], 2)
+
+    @override_settings(LFC_SEARCH_BACKEND="lfc.utils.search.SimpleSearchBackend")
+    def test_simple_search(self):
+        """
+        """
+        backend = get_search_backend()
+        self.assertEqual(backend.search("lorem", "en"), [self.p1.id, self.p3.id])
+        self.assertEqual(backend.search("lorem", "en", start=1, limit=1), [self.p3.id])
+        self.assertEqual(backend.count("lorem", "en"), 2)
+
+    def test_reindex_objects(self):
+        """
+        """
+        BaseContent.objects.update(searchable_text="")
+        SearchIndex.objects.all().delete()
+
+        # Stops after the first batch
+        progress = reindex_objects(seconds=0, batch_size=2)
+        self.assertEqual(progress["done"], 2)
+        self.assertEqual(progress["total"], 3)
+        self.assertEqual(progress["finished"], False)
+        self.assertEqual(get_reindex_progress(), progress)
+        self.assertEqual(BaseContent.objects.get(pk=self.p1.id).searchable_text, self.p1.get_searchable_text())
+        self.assertEqual(BaseContent.objects.get(pk=self.p3.id).searchable_text, "")
+
+        # Resumes with the passed progress, without the cached one
+        cache.clear()
+        progress = reindex_objects(progress, batch_size=2)
+        self.assertEqual(progress["done"], 3)
+        self.assertEqual(progress["finished"], True)
+        self.assertEqual(BaseContent.objects.get(pk=self.p3.id).searchable_text, self.p3.get_searchable_text())
+        self.assertEqual(get_search_backend().search("lorem", "en"), [self.p1.id, self.p3.id])
@@ -6,6 +6,7 @@ import lfc.utils.registration
 from lfc.utils import import_module
 from lfc.models import Application
 from lfc.models import BaseContent
+from lfc.models import File
 from lfc.models import Portal
 from lfc.tests.utils import create_request
 
@@ -70,3 +71,72 @@ class UtilsTestCase(TestCase):
         # With passed request
         ct = lfc.utils.get_content_objects(request, slug="page-1")
         self.assertEqual(len(ct), 0)
+
+    def test_renumber_positions(self):
+        """
+        """
+        f1 = File.objects.create(title="File 1", content=self.p1, position=1000)
+        f2 = File.objects.create(title="File 2", content=self.p1, position=3000)
+
+        # New files are appended without changing the existing ones
+        self.assertEqual(lfc.utils.get_next_position(self.p1.files.all()), 4000)
+        f3 = File.objects.create(title="File 3", content=self.p1, position=4000)
+
+        # Unique positions are kept
+        self.assertEqual(lfc.utils.renumber_positions(self.p1.files.all()), [])
+
+        # Equal positions are renumbered
+        File.objects.filter(pk=f3.id).update(position=1000)
+        changed = lfc.utils.renumber_positions(self.p1.files.all())
+        self.assertEqual(changed, [f3.id])
+        self.assertEqual(list(self.p1.files.order_by("position").values_list("id", "position")),
+                         [(f1.id, 1000), (f3.id, 2000), (f2.id, 3000)])
+
+
+class TraverseObjectTestCase(TestCase):
+    """
+    """
+    def setUp(self):
+        """
+        """
+        from lfc.utils.initialize import initialize
+        initialize()
+
+        import_module("lfc_page").install()
+        try:
+            Application.objects.create(name="lfc_page")
+        except Application.DoesNotExist:
+            pass
+
+        Portal.objects.create()
+        self.p1 = Page.objects.create(title="Page 1", slug="page-1")
+        self.p11 = Page.objects.create(title="Page 1-1", slug="page-1-1", parent=self.p1)
+        self.p111 = Page.objects.create(title="Page 1-1-1", slug="page-1-1-1", parent=self.p11)
+
+    def test_slug_path(self):
+        """
+        """
+        self.assertEqual(self.p1.slug_path, "page-1")
+        self.assertEqual(self.p11.slug_path, "page-1/page-1-1")
+        self.assertEqual(self.p111.slug_path, "page-1/page-1-1/page-1-1-1")
+
+    def test_slug_path_after_rename(self):
+        """
+        """
+        self.p1.slug = "page-x"
+        self.p1.save()
+
+        p111 = Page.objects.get(pk=self.p111.id)
+        self.assertEqual(p111.slug_path, "page-x/page-1-1/page-1-1-1")
+
+    def test_traverse_object(self):
+        """
+        """
+        request = create_request()
+
+        obj = lfc.utils.traverse_object(request, "page-1/page-1-1/page-1-1-1")
+        self.assertEqual(obj, self.p111)
+        self.assertTrue(isinstance(obj, Page))
+
+        from django.http import Http404
+        self.assertRaises(Http404, lfc.utils.traverse_object, request, "page-1/page-x")
@@ -49,6 +49,7 @@ urlpatterns += patterns('lfc.views',
     url(r'^set-language/(?P<language>[-\w]{2})/(?P<id>\d+)/$', 'set_language', name="lfc_set_language"),
 
     url(r'^file/(?P<id>[-\w]*)', "file", name="lfc_file"),
+    url(r'^lfc-thumbnails/(?P<width>\d+)x(?P<height>\d+)/(?P<name>.+)$', "thumbnail", name="lfc_thumbnail"),
 
     url(r'^(?P<language>[-\w]{2})$', "base_view", name="lfc_base_view"),
     url(r'^(?P<language>[-\w]{2})/(?P<slug>.*)', "base_view", name="lfc_base_view"),
@@ -2,13 +2,16 @@
 
 # python imports
 import datetime
+import hashlib
 import json
 import urllib
 import re
 import sys
+import time
 from HTMLParser import HTMLParser
 
 # django settings
+from django import template
 from django.conf import settings
 from django.contrib.auth import SESSION_KEY
 from django.contrib.auth import BACKEND_SESSION_KEY
@@ -16,6 +19,12 @@ from django.contrib.auth import load_backend
 from django.contrib.auth.models import AnonymousUser
 from django.core.cache import cache
 from django.core.urlresolvers import reverse
+from django.db.models import Case
+from django.db.models import IntegerField
+from django.db.models import Max
+from django.db.models import Min
+from django.db.models import Value
+from django.db.models import When
 from django.http import Http404
 from django.http import HttpResponse
 from django.http import HttpResponseRedirect
@@ -26,6 +35,11 @@ from django.utils import translation
 
 # lfc imports
 import lfc.models
+from lfc.settings import POSITION_GAP
+
+# Compiled templates of texts, see render_text
+_templates = {}
+TEMPLATES_MAX = 1000
 
 
 def get_cached_object(klass, *args, **kwargs):
@@ -38,8 +52,8 @@ def get_cached_object(klass, *args, **kwargs):
     Note: Like with get(), an MultipleObjectsReturned will be raised if more than one
     object is found.
     """
-    # CACHE
-    cache_key = "%s-%s" % (klass.__name__.lower(), kwargs.values()[0])
+    # CACHE. Is invalidated by clear_cache.
+    cache_key = get_cache_key("%s-%s" % (klass.__name__.lower(), kwargs.values()[0]))
     object = cache.get(cache_key)
     if object is not None:
         return object
@@ -158,30 +172,169 @@ def get_content_objects(request=None, *args, **kwargs):
     if parent and parent.order_by:
         objs = objs.order_by(parent.order_by)
 
+    return filter_content_objects(request, objs.get_content_objects())
+
+
+def filter_content_objects(request, objs):
+    """Returns the passed specific content objects which are registered and
+    (if the request is passed) which the current user is allowed to view
+    currently.
+    """
     result = []
 
     if request is None or request.user.is_superuser:
         for obj in objs:
-            obj = obj.get_content_object()
             if lfc.utils.registration.get_info(obj):
                 result.append(obj)
     else:
+        lfc.utils.resolver.get_permission_resolver(request.user).prefetch(objs)
         for obj in objs:
-            obj = obj.get_content_object()
             if lfc.utils.registration.get_info(obj) and \
                 obj.has_permission(request.user, "view") and \
                 obj.is_active(request.user):
-                obj = obj.get_content_object()
                 result.append(obj)
 
     return result
 
 
+def set_positions(model, positions):
+    """Sets the positions of the objects of passed model with one query,
+    without calling save (hence without signals and cache invalidation).
+
+    **Parameters:**
+
+    model
+        The model of the objects, e.g. lfc.models.BaseContent.
+
+    positions
+        A dict of object id -> new position.
+    """
+    if not positions:
+        return
+
+    model.objects.filter(pk__in=positions.keys()).update(position=Case(
+        *[When(pk=id, then=Value(position)) for id, position in positions.items()],
+        output_field=IntegerField()))
+
+
+def renumber_positions(objs, gap=POSITION_GAP):
+    """Renumbers the positions of passed objects in their current order, but
+    only if two of them have the same position (e.g. after they have been
+    entered manually). The changed positions are written with one query.
+    Returns the ids of the objects whose positions have been changed.
+
+    **Parameters:**
+
+    objs
+        A queryset of the objects which are ordered together, e.g. the
+        images of a content object.
+
+    gap
+        The distance between the new positions.
+    """
+    rows = list(objs.order_by("position", "pk").values_list("pk", "position"))
+    if len(set([position for pk, position in rows])) == len(rows):
+        return []
+
+    positions = {}
+    for i, (pk, position) in enumerate(rows):
+        if position != (i + 1) * gap:
+            positions[pk] = (i + 1) * gap
+    set_positions(objs.model, positions)
+
+    return positions.keys()
+
+
+def get_next_position(siblings, gap=POSITION_GAP):
+    """Returns the position for an object which is added after passed
+    siblings.
+
+    **Parameters:**
+
+    siblings
+        A queryset of the objects which are ordered together with the new
+        object.
+
+    gap
+        The distance to the position of the last sibling.
+    """
+    position = siblings.aggregate(Max("position"))["position__max"]
+    return (position or 0) + gap
+
+
+def move_position(obj, siblings, up, gap=POSITION_GAP):
+    """Moves passed object one place up or down within passed siblings by
+    setting its position between the positions of the new neighbours. Only
+    if there is no gap left the siblings are renumbered (with passed gap).
+
+    The position of the object is set, but the object isn't saved. Returns
+    the ids of the siblings whose positions have been changed (which is
+    empty in the common case).
+
+    **Parameters:**
+
+    obj
+        The object to move. Needs a position attribute.
+
+    siblings
+        A queryset of all objects which are ordered together with the object
+        (including or excluding the object).
+
+    up
+        If True the object is moved up, otherwise down.
+
+    gap
+        The distance between the positions, if the siblings are renumbered.
+    """
+    siblings = siblings.exclude(pk=obj.pk)
+    if up:
+        neighbours = list(siblings.filter(position__lte=obj.position).order_by(
+            "-position", "-pk").values_list("position", flat=True)[:2])
+    else:
+        neighbours = list(siblings.filter(position__gte=obj.position).order_by(
+            "position", "pk").values_list("position", flat=True)[:2])
+
+    if not neighbours:
+        return []
+
+    if neighbours[0] != obj.position:
+        if len(neighbours) == 2:
+            lower, upper = sorted(neighbours)
+        elif up:
+            lower, upper = 0, neighbours[0]
+        else:
+            lower, upper = neighbours[0], neighbours[0] + 2 * gap
+
+        if upper - lower >= 2:
+            obj.position = (lower + upper) // 2
+            return []
+
+    # No gap left (or equal positions): renumber all siblings
+    rows = list(siblings.order_by("position", "pk").values_list("pk", "position"))
+    index = len([1 for pk, position in rows if (position, pk) < (obj.position, obj.pk)])
+    if up:
+        index = max(0, index - 1)
+    else:
+        index = min(len(rows), index + 1)
+    rows.insert(index, (obj.pk, obj.position))
+
+    positions = {}
+    for i, (pk, position) in enumerate(rows):
+        if pk == obj.pk:
+            obj.position = (i + 1) * gap
+        elif position != (i + 1) * gap:
+            positions[pk] = (i + 1) * gap
+    set_positions(siblings.model, positions)
+
+    return positions.keys()
+
+
 def get_portal(pk=1):
     """Returns the default portal.
     """
-    # CACHE
-    cache_key = "%s-portal-%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, pk)
+    # CACHE. Is invalidated on every change of the portal (see
+    # lfc.listeners).
+    cache_key = get_cache_key("portal-%s" % pk)
     portal = cache.get(cache_key)
     if portal:
         return portal
@@ -196,6 +349,37 @@ def get_portal(pk=1):
     return portal
 
 
+def get_active_dates():
+    """Returns the latest start or end date of all objects which has passed
+    and the next one which hasn't passed yet. Both might be None.
+
+    Whenever one of these dates passes the active objects and hence the
+    navigation change, without that any object has been changed.
+    """
+    now = datetime.datetime.now()
+
+    # CACHE
+    cache_key = get_cache_key("active-dates", names=["navigation"])
+    dates = cache.get(cache_key)
+    if dates is not None and (dates[1] is None or dates[1] > now):
+        return dates
+
+    passed = []
+    upcoming = []
+    for name in ("start_date", "end_date"):
+        objs = lfc.models.BaseContent.objects
+        passed.append(objs.filter(**{"%s__lte" % name: now}).aggregate(date=Max(name))["date"])
+        upcoming.append(objs.filter(**{"%s__gt" % name: now}).aggregate(date=Min(name))["date"])
+
+    passed = [date for date in passed if date is not None]
+    upcoming = [date for date in upcoming if date is not None]
+
+    dates = (passed and max(passed) or None, upcoming and min(upcoming) or None)
+    cache.set(cache_key, dates)
+
+    return dates
+
+
 def get_user_from_session_key(session_key):
     """Returns the user from the passed session_key.
 
@@ -232,14 +416,36 @@ def traverse_object(request, path):
     language = translation.get_language()
 
     # CACHE
-    cache_key_1 = "%s-obj-%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, path)
-    cache_key_2 = "%s-%s" % (request.user.id, language)
+    cache_key_1 = get_cache_key("obj-%s" % path, [path])
+    cache_key_2 = "%s-%s" % (lfc.utils.resolver.get_permission_fingerprint(request.user), language)
 
     obj = get_cache([cache_key_1, cache_key_2])
     if obj:
         return obj
+
+    # Paths which are too long are not indexed, see BaseContent.slug_path
+    if len(path) > lfc.models.BaseContent._meta.get_field("slug_path").max_length:
+        obj = _traverse_slugs(request, path, language)
+    else:
+        objs = list(lfc.models.BaseContent.objects.filter(
+            slug_path=path, language__in=("0", language)))
+
+        if not objs:
+            raise Http404
+
+        # Prefer the object in the current language to the neutral one
+        objs.sort(key=lambda obj: obj.language != language)
+        obj = objs[0].get_content_object()
+
+    set_cache([cache_key_1, cache_key_2], obj)
+    return obj
+
+
+def _traverse_slugs(request, path, language):
+    """Returns the object with the given path by walking the slugs of the
+    path.
+    """
     paths = path.split("/")
-    language = translation.get_language()
 
     try:
         obj = lfc.utils.get_content_object(request, slug=paths[0],
@@ -253,43 +459,29 @@ def traverse_object(request, path):
         except lfc.models.BaseContent.DoesNotExist:
             raise Http404
 
-    set_cache([cache_key_1, cache_key_2], obj)
     return obj
 
 
 def delete_cache(keys):
-    """Deletes cache based on keys
+    """Deletes the value which has been cached with passed keys as well as all
+    values whose keys start with passed keys, e.g. delete_cache(["a"])
+    deletes the values of ["a", "b"] and ["a", "c", "d"].
     """
-    if len(keys) == 1:
-        cache.delete(keys[0])
-    else:
-        start = cache.get(keys[0])
-        d = start
-        for key in keys[1:-1]:
-            d = d[key]
+    if isinstance(keys, basestring):
+        keys = [keys]
 
-        del d[keys[-1]]
-        cache.set(keys[0], start)
+    cache.delete(_get_flat_key(keys))
+    _increase_generations([_get_keys_generation_name(keys)])
 
 
 def set_cache(keys, value):
-    """Caches value in a dict which is based on keys.
+    """Caches value under a flat key which is based on keys. The size of the
+    key is bounded, no matter how many or how long keys are passed.
     """
     assert(isinstance(keys, (tuple, list)))
     assert(len(keys) > 1)
 
-    start = cache.get(keys[0])
-    if start is None:
-        start = {}
-    d = start
-    for key in keys[1:-1]:
-        if key not in d.keys():
-            d[key] = {}
-        d = d[key]
-
-    d[keys[-1]] = value
-
-    cache.set(keys[0], start)
+    cache.set(_get_flat_key(keys), value)
 
 
 def get_cache(keys):
@@ -298,36 +490,251 @@ def get_cache(keys):
     assert(isinstance(keys, (tuple, list)))
     assert(len(keys) > 1)
 
-    d = cache.get(keys[0])
-    if d is None:
-        return None
-    else:
-        for key in keys[1:]:
-            try:
-                d = d[key]
-            except KeyError:
-                return None
-        return d
+    return cache.get(_get_flat_key(keys))
+
+
+def _get_flat_key(keys):
+    """Returns a flat cache key for passed keys, which contains the
+    generations of all leading parts of the keys (see delete_cache).
+    """
+    names = [_get_keys_generation_name(keys[:i]) for i in range(1, len(keys))]
+    generations = _get_generations(names)
+
+    key = [force_unicode(key) for key in keys]
+    key.extend([generations[name] for name in names])
+
+    return "%s-cache-%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX,
+                            hashlib.md5(json.dumps(key)).hexdigest())
+
+
+def _get_keys_generation_name(keys):
+    """Returns the name of the generation of passed leading keys.
+    """
+    return "keys:%s" % json.dumps([force_unicode(key) for key in keys])
 
 
 def clear_cache():
-    """Clears the complete cache.
+    """Invalidates all LFC cache entries by increasing the generation of the
+    site (see get_cache_key). Other entries of the cache are left untouched.
     """
-    # memcached
-    try:
-        cache._cache.flush_all()
-    except AttributeError:
-        pass
+    _increase_generations(["site"])
 
-    try:
-        cache._cache.clear()
-    except AttributeError:
-        pass
 
-    try:
-        cache._expire_info.clear()
-    except AttributeError:
-        pass
+def get_cache_key(key, dependencies=(), names=()):
+    """Returns passed key within the namespace of the current generations of
+    the site and of passed dependencies. If one of the generations is
+    increased (see invalidate_cache and invalidate_subtree) the key changes,
+    hence the stale entry isn't used anymore and just ages out.
+
+    **Parameters:**
+
+    key
+        The key of the entry, e.g. "children-1".
+
+    dependencies
+        Content objects or slug paths (e.g. "page-1/page-1-1") on which the
+        entry depends. A content object depends on itself and the subtrees
+        of all its ancestors. The empty slug path stands for the top level
+        objects.
+
+    names
+        Additional generation names on which the entry depends, e.g.
+        "registrations".
+    """
+    generation_names = _get_dependency_names(dependencies, names)
+    generations = _get_generations(generation_names)
+    namespace = "-".join([str(generations[name]) for name in generation_names])
+
+    # Keys may contain paths, which can be too long or contain characters
+    # memcached doesn't accept.
+    if len(key) > 100 or re.search(r"[^\w\-/.:]", key):
+        key = hashlib.md5(key.encode("utf-8")).hexdigest()
+
+    return "%s-%s-%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, key,
+                         hashlib.md5(namespace).hexdigest())
+
+
+def get_cache_modified(dependencies=(), names=()):
+    """Returns the time (as timestamp) at which an entry which depends on
+    passed dependencies and names has been invalidated at last (see
+    get_cache_key). If that is unknown the current time is returned.
+
+    **Parameters:**
+
+    dependencies
+        Content objects or slug paths.
+
+    names
+        Generation names, e.g. "registrations".
+    """
+    now = time.time()
+    keys = dict([(_get_modified_key(name), name) for name in _get_dependency_names(dependencies, names)])
+    cached = cache.get_many(keys.keys())
+
+    modified = 0
+    for key in keys.keys():
+        if key in cached:
+            modified = max(modified, cached[key])
+        else:
+            # The time of the last invalidation has been evicted, hence every
+            # entry might have been changed.
+            cache.add(key, now, None)
+            modified = now
+
+    return modified
+
+
+def invalidate_cache(dependencies=(), names=()):
+    """Invalidates all cache entries which depend on the passed content
+    objects or slug paths and passed generation names (see get_cache_key).
+
+    **Parameters:**
+
+    dependencies
+        Content objects or slug paths.
+
+    names
+        Generation names, e.g. "registrations".
+    """
+    generation_names = list(names)
+    for dependency in dependencies:
+        generation_names.extend(_get_generation_names(dependency))
+    _increase_generations(generation_names)
+
+
+def invalidate_subtree(dependency):
+    """Invalidates all cache entries which depend on passed content object
+    or slug path or on one of its descendants with one increment.
+
+    **Parameters:**
+
+    dependency
+        Content object or slug path.
+    """
+    names = _get_generation_names(dependency, subtrees=True)
+    if names[-1].startswith("tree:"):
+        # Descendants may have paths which are too long to be indexed.
+        _increase_generations([names[-1], "unindexed"])
+    elif names == ["node:"]:
+        clear_cache()
+    else:
+        _increase_generations(["unindexed"])
+
+
+def _get_dependency_names(dependencies, names):
+    """Returns the names of all generations an entry which depends on passed
+    dependencies and names depends on.
+    """
+    generation_names = ["site"] + list(names)
+    for dependency in dependencies:
+        generation_names.extend(_get_generation_names(dependency, subtrees=True))
+    return generation_names
+
+
+def _get_generation_names(dependency, subtrees=False):
+    """Returns the names of the generations of passed content object or slug
+    path, i.e. the one of the node itself and, if subtrees is True, the ones
+    of the subtrees of all its ancestors and itself.
+    """
+    max_length = lfc.models.BaseContent._meta.get_field("slug_path").max_length
+    if isinstance(dependency, lfc.models.BaseContent):
+        path = dependency.slug_path or None
+    elif len(dependency) > max_length:
+        path = None
+    else:
+        path = dependency
+
+    # See BaseContent.slug_path
+    if path is None:
+        return ["unindexed"]
+
+    names = ["node:%s" % path]
+    if subtrees and path:
+        parts = path.split("/")
+        for i in range(len(parts)):
+            names.append("tree:%s" % "/".join(parts[:i + 1]))
+
+    return names
+
+
+def _get_generations(names):
+    """Returns the current generations of passed names as dict. Missing
+    generations are created.
+    """
+    keys = dict([(_get_generation_key(name), name) for name in names])
+    cached = cache.get_many(keys.keys())
+
+    generations = {}
+    for key, name in keys.items():
+        if key in cached:
+            generations[name] = cached[key]
+        else:
+            # New generations start with the current time, so that entries of
+            # an evicted generation don't become valid again.
+            generations[name] = int(time.time() * 1000)
+            cache.add(key, generations[name], None)
+
+    return generations
+
+
+def _increase_generations(names):
+    """Increases the generations of passed names and notes the time of the
+    increase (see get_cache_modified).
+    """
+    now = time.time()
+    for name in set(names):
+        try:
+            cache.incr(_get_generation_key(name))
+        except ValueError:
+            # There is no generation, hence no entries to invalidate
+            pass
+        cache.set(_get_modified_key(name), now, None)
+
+
+def _get_generation_key(name):
+    """Returns the cache key of the generation with passed name.
+    """
+    return "%s-generation-%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX,
+                                 hashlib.md5(name.encode("utf-8")).hexdigest())
+
+
+def _get_modified_key(name):
+    """Returns the cache key of the time the generation with passed name has
+    been increased at last.
+    """
+    return "%s-modified-%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX,
+                               hashlib.md5(name.encode("utf-8")).hexdigest())
+
+
+def render_text(text, context):
+    """Renders passed text as template if it contains template syntax. The
+    tags of LFC_TAGS are loaded automatically. Texts without template syntax
+    are returned unchanged.
+
+    The compiled templates are kept in memory, keyed by the text, hence every
+    text is compiled only once per process.
+
+    **Parameters:**
+
+    text
+        The text to render, e.g. the text of a page.
+
+    context
+        The context with which the text is rendered.
+    """
+    if not text or ("{%" not in text and "{{" not in text and "{#" not in text):
+        return text
+
+    key = hashlib.md5(force_unicode(text).encode("utf-8")).hexdigest()
+    compiled = _templates.get(key)
+    if compiled is None:
+        tags = "".join(["{%% load %s %%}" % tag for tag in getattr(settings, "LFC_TAGS", [])])
+        compiled = template.Template(tags + text)
+        if len(_templates) >= TEMPLATES_MAX:
+            _templates.clear()
+        _templates[key] = compiled
+
+    return compiled.render(context)
 
 
 def import_module(module):
@@ -0,0 +1,407 @@
+# python imports
+import copy
+
+# django imports
+from django.contrib.contenttypes.models import ContentType
+from django.db import IntegrityError
+from django.db import models
+from django.db import transaction
+from django.db.models import Case
+from django.db.models import Value
+from django.db.models import When
+
+# portlets imports
+from portlets.models import PortletAssignment
+
+# workflows imports
+import workflows.utils
+
+# lfc imports
+import lfc.models
+import lfc.utils
+from lfc.fields.thumbs import get_thumb_name
+from lfc.utils.search import get_search_backend
+
+# The number of ids which are passed to one query, see _get_chunks
+CHUNK_SIZE = 500
+
+
+def generate_slug(source_obj, parent):
+    """Generates a unique slug for passed source_obj in passed parent
+
+    **Parameters:**
+
+        source_obj
+            The object for which the slug should be generated
+
+        parent
+            The object in which the source_obj should be pasted. The slug
+            which is created is unique within parent.
+    """
+    # Generate slug for pasted object
+    new_slug = source_obj.slug
+    try:
+        lfc.models.BaseContent.objects.get(slug=new_slug, parent=parent, language=source_obj.language)
+    except lfc.models.BaseContent.DoesNotExist:
+        pass
+    else:
+        i = 1
+        while 1:
+            new_slug = source_obj.slug + "-%s" % i
+            try:
+                lfc.models.BaseContent.objects.get(slug=new_slug, parent=parent, language=source_obj.language)
+            except lfc.models.BaseContent.DoesNotExist:
+                break
+            i += 1
+
+    return new_slug
+
+
+def copy_object(source, parent_id, slug, position, descendants=True):
+    """Copies passed content object, including its descendants, the
+    translations of all copied objects (which are placed beside the
+    translated originals) and the images, files and portlets of all of them.
+    Returns the copy of passed object.
+
+    The source objects are loaded with a few queries up front. The copies are
+    inserted parents first, references between copied objects (parent,
+    canonical and standard) point to the copies. The tree index, the search
+    index, images, files and portlets are written in bulk and the caches are
+    invalidated once at the end. Everything happens within one transaction.
+    If the copying fails the stored copies of files and thumbnails are
+    deleted again. This isn't possible if an outer transaction is rolled
+    back later, then the copied files are left in the storage.
+
+    The save methods of sub classes of BaseContent are called for every copy
+    (before references, images, files and portlets are copied), the
+    bookkeeping of BaseContent.save is skipped.
+
+    **Parameters:**
+
+    source
+        The content object which is copied.
+
+    parent_id
+        The id of the parent of the copy or None for the top level.
+
+    slug
+        The slug of the copy. Has to be unique within the parent.
+
+    position
+        The position of the copy within the parent.
+
+    descendants
+        If False only the object itself and its translations are copied,
+        e.g. if it is pasted into one of its own descendants.
+    """
+    copier = Copier()
+    try:
+        with transaction.atomic():
+            return copier.copy(source, parent_id, slug, position, descendants)
+    except Exception:
+        copier.delete_files()
+        raise
+
+
+class Copier(object):
+    """Copies subtrees of content objects, see copy_object.
+    """
+    def __init__(self):
+        # The ids of the source objects, parents before their children
+        self.ids = []
+        self.id_set = set()
+
+        # Source id -> (parent id, slug, position) of the copies which aren't
+        # placed within a copied parent. Slug and position are None if they
+        # are calculated on insertion.
+        self.roots = {}
+
+        # Source id -> source object / copy
+        self.sources = {}
+        self.copies = {}
+
+        # (storage, name) of the stored copies of files and thumbnails
+        self.files = []
+
+    def copy(self, source, parent_id, slug, position, descendants=True):
+        self._collect(source, parent_id, slug, position, descendants)
+
+        for chunk in _get_chunks(self.ids):
+            for obj in lfc.models.BaseContent.objects.filter(pk__in=chunk).get_content_objects():
+                self.sources[obj.id] = obj
+
+        for id in self.ids:
+            self._insert(self.sources[id])
+
+        self._update_references()
+        self._create_tree_relations()
+        self._copy_generic_relations(lfc.models.Image, "image")
+        self._copy_generic_relations(lfc.models.File, "file")
+        self._copy_generic_relations(PortletAssignment)
+
+        for obj in self.copies.values():
+            workflows.utils.set_initial_state(obj)
+
+        backend = get_search_backend()
+        for chunk in _get_chunks(self.copies.values()):
+            backend.index_objects(chunk)
+
+        # The copies are new, only the parents which list them are affected.
+        parent_ids = set([parent_id for parent_id, slug, position in self.roots.values()])
+        parents = list(lfc.models.BaseContent.objects.filter(pk__in=[id for id in parent_ids if id]))
+        if None in parent_ids:
+            parents.append("")
+        lfc.utils.invalidate_cache(parents, names=["navigation"])
+
+        return self.copies[source.id]
+
+    def _collect(self, source, parent_id, slug, position, descendants):
+        """Collects the ids of all objects which are copied.
+        """
+        self.roots[source.id] = (parent_id, slug, position)
+        added = self._add_subtree(source.id, descendants)
+
+        # Translations of copied objects are copied (with their descendants)
+        # into the parents of the originals, unless they are copied anyway.
+        while added:
+            translations = []
+            for chunk in _get_chunks(added):
+                translations.extend(lfc.models.BaseContent.objects.filter(
+                    canonical__in=chunk).values_list("id", "parent"))
+
+            added = []
+            for id, parent_id in translations:
+                if id not in self.id_set:
+                    self.roots[id] = (parent_id, None, None)
+                    added.extend(self._add_subtree(id))
+
+    def _add_subtree(self, id, descendants=True):
+        """Adds passed id and (optionally) the ids of its descendants, which
+        aren't added yet. Returns the added ids.
+        """
+        added = [id]
+        if descendants:
+            relations = lfc.models.ContentTreeRelation.objects.filter(ancestor=id, depth__gt=0).order_by("depth")
+            added.extend([descendant_id for descendant_id in relations.values_list("descendant", flat=True)
+                          if descendant_id not in self.id_set])
+        self.ids.extend(added)
+        self.id_set.update(added)
+        return added
+
+    def _insert(self, source):
+        """Inserts the copy of passed object. The bookkeeping of
+        BaseContent.save is skipped (see there) and done for all copies at
+        once, but the save methods of sub classes are called.
+        """
+        obj = copy.deepcopy(source)
+        obj.pk = None
+        obj.id = None
+
+        if source.id in self.roots:
+            obj.parent_id, slug, position = self.roots[source.id]
+            if slug is None:
+                parent = obj.parent_id and lfc.models.BaseContent.objects.get(pk=obj.parent_id)
+                slug = generate_slug(source, parent)
+            if position is None:
+                position = lfc.utils.get_next_position(lfc.models.BaseContent.objects.filter(
+                    parent=obj.parent_id, language__in=("0", source.language)))
+            obj.slug = slug
+            obj.position = position
+        else:
+            obj.parent_id = self.copies[source.parent_id].id
+
+        # References to copied objects are set after all of them are inserted.
+        if source.canonical_id in self.id_set:
+            obj.canonical_id = None
+        if source.standard_id in self.id_set:
+            obj.standard_id = None
+
+        if source.parent_id in self.copies and source.id not in self.roots:
+            parent = self.copies[source.parent_id]
+            parent_path, parent_language = parent.slug_path, parent.language
+        else:
+            parent_path, parent_language = obj._get_parent_data()
+
+        obj.searchable_text = obj.get_searchable_text()
+        obj.slug_path = lfc.models._join_slug_path(parent_path, obj.slug)
+        obj.absolute_url = lfc.models._calculate_url(obj.slug_path, obj.language, parent_language)
+        obj._parent_language = parent_language
+
+        obj._copying = True
+        try:
+            self._save(obj)
+        finally:
+            del obj._copying
+        self.copies[source.id] = obj
+
+    def _save(self, obj):
+        """Saves passed copy.
+
+        Workaround for django-tagging: updating the tag relations of the copy
+        after it has been inserted might raise an IntegrityError, e.g. for
+        tags which differ only in case on a case insensitive database. Then
+        the copy is saved without tag relations, but keeps its tags field.
+        The savepoint keeps the transaction of the copy usable.
+        """
+        try:
+            with transaction.atomic():
+                obj.save()
+        except IntegrityError:
+            tags = obj.tags
+            obj.pk = None
+            obj.id = None
+            obj.tags = ""
+            obj.save()
+            lfc.models.BaseContent.objects.filter(pk=obj.id).update(tags=tags)
+            obj.tags = tags
+
+    def delete_files(self):
+        """Deletes the stored copies of files and thumbnails, e.g. after the
+        copying has failed.
+        """
+        for storage, name in self.files:
+            try:
+                storage.delete(name)
+            except (IOError, OSError):
+                pass
+        self.files = []
+
+    def _update_references(self):
+        """Points canonical and standard of the copies to the copies of the
+        objects the originals point to. The URLs of objects with standard
+        objects are the URLs of the standard objects.
+        """
+        canonicals = {}
+        standards = {}
+        urls = {}
+        for id, source in self.sources.items():
+            obj = self.copies[id]
+            if source.canonical_id in self.id_set:
+                obj.canonical_id = self.copies[source.canonical_id].id
+                canonicals[obj.id] = obj.canonical_id
+            if source.standard_id in self.id_set:
+                obj.standard_id = self.copies[source.standard_id].id
+                standards[obj.id] = obj.standard_id
+                standard = self.copies[source.standard_id]
+                obj.absolute_url = lfc.models._calculate_url(
+                    standard.slug_path, standard.language, standard._parent_language)
+                urls[obj.id] = obj.absolute_url
+            elif source.standard_id:
+                obj.absolute_url = obj.standard.get_own_url()
+                urls[obj.id] = obj.absolute_url
+
+        _update_values("canonical", canonicals, models.IntegerField())
+        _update_values("standard", standards, models.IntegerField())
+        _update_values("absolute_url", urls, models.CharField())
+
+    def _create_tree_relations(self):
+        """Creates the tree index (see ContentTreeRelation) of the copies.
+        """
+        # Id of the copy -> list of (ancestor id, depth), including itself
+        ancestors = {}
+        relations = []
+        for id in self.ids:
+            obj = self.copies[id]
+            if obj.parent_id is None:
+                ancestors[obj.id] = [(obj.id, 0)]
+            else:
+                if obj.parent_id not in ancestors:
+                    ancestors[obj.parent_id] = list(lfc.models.ContentTreeRelation.objects.filter(
+                        descendant=obj.parent_id).values_list("ancestor", "depth"))
+                ancestors[obj.id] = [(obj.id, 0)] + [
+                    (ancestor_id, depth + 1) for ancestor_id, depth in ancestors[obj.parent_id]]
+
+            for ancestor_id, depth in ancestors[obj.id]:
+                relations.append(lfc.models.ContentTreeRelation(
+                    ancestor_id=ancestor_id, descendant_id=obj.id, depth=depth))
+
+        lfc.models.ContentTreeRelation.objects.bulk_create(relations, batch_size=CHUNK_SIZE)
+
+    def _copy_generic_relations(self, model, file_field=None):
+        """Copies the instances of passed model (images, files or portlet
+        assignments) which belong to the copied objects with one query per
+        content type. If passed, the file of file_field is copied as well.
+        """
+        ids_by_type = {}
+        for id, source in self.sources.items():
+            content_type = ContentType.objects.get_for_model(source)
+            ids_by_type.setdefault(content_type.id, []).append(id)
+
+        fields = [field for field in model._meta.concrete_fields if not field.primary_key]
+
+        new_instances = []
+        for content_type_id, ids in ids_by_type.items():
+            for chunk in _get_chunks(ids):
+                for instance in model.objects.filter(content_type=content_type_id, content_id__in=chunk):
+                    values = {}
+                    for field in fields:
+                        value = getattr(instance, field.attname)
+                        if isinstance(field, models.FileField):
+                            value = value.name
+                        values[field.attname] = value
+
+                    new_instance = model(**values)
+                    new_instance.content_id = self.copies[instance.content_id].id
+                    if file_field:
+                        self.files.extend(_copy_file(getattr(instance, file_field),
+                                                     getattr(new_instance, file_field)))
+                    new_instances.append(new_instance)
+
+        model.objects.bulk_create(new_instances, batch_size=CHUNK_SIZE)
+
+
+def _copy_file(source, target):
+    """Copies the stored file (and for images the existing thumbnails) of
+    the source field file and assigns the copy to the target field file.
+    Returns the stored files as list of (storage, name).
+    """
+    if not source:
+        return []
+
+    storage = source.storage
+    fh = storage.open(source.name)
+    try:
+        target.name = storage.save(source.name, fh)
+    finally:
+        fh.close()
+
+    stored = [(storage, target.name)]
+
+    for size in getattr(source, "sizes", None) or ():
+        thumb_name = get_thumb_name(source.name, size)
+        if not storage.exists(thumb_name):
+            continue
+
+        # The field file expects its thumbnails at fixed names, hence a stale
+        # thumbnail is replaced.
+        new_thumb_name = get_thumb_name(target.name, size)
+        if storage.exists(new_thumb_name):
+            storage.delete(new_thumb_name)
+
+        fh = storage.open(thumb_name)
+        try:
+            stored.append((storage, storage.save(new_thumb_name, fh)))
+        finally:
+            fh.close()
+
+    return stored
+
+
+def _update_values(name, values, output_field):
+    """Sets the field with passed name of the content objects with the ids
+    of passed dict to the values of the dict, with one query per chunk.
+    """
+    items = values.items()
+    for i in range(0, len(items), CHUNK_SIZE):
+        chunk = dict(items[i:i + CHUNK_SIZE])
+        lfc.models.BaseContent.objects.filter(pk__in=chunk.keys()).update(**{name: Case(
+            *[When(pk=id, then=Value(value)) for id, value in chunk.items()],
+            output_field=output_field)})
+
+
+def _get_chunks(items):
+    """Returns passed items in chunks of CHUNK_SIZE, e.g. to stay within the
+    limits of query parameters.
+    """
+    items = list(items)
+    return [items[i:i + CHUNK_SIZE] for i in range(0, len(items), CHUNK_SIZE)]
@@ -1,11 +1,11 @@
 # django imports
 from django.core.cache import cache
-from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import ObjectDoesNotExist
 from django.db import IntegrityError
 
 # lfc imports
+import lfc.utils
 from lfc.models import BaseContent
 from lfc.models import ContentTypeRegistration
 from lfc.models import Portal
@@ -32,8 +32,9 @@ def get_info(obj_or_type):
     else:
         type = obj_or_type
 
-    # CACHE
-    cache_key = "%s-info-%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, type)
+    # CACHE. Is invalidated on every change of a registration (see
+    # lfc.listeners).
+    cache_key = lfc.utils.get_cache_key("info-%s" % type, names=["registrations"])
     result = cache.get(cache_key)
     if result:
         return result
@@ -199,7 +200,6 @@ def unregister_content_type(name):
         pass
     else:
         ctr.delete()
-        cache.delete("%s-info-%s" % (settings.CACHE_MIDDLEWARE_KEY_PREFIX, ctr.type))
 
 
 def register_template(name, path, children_columns=0, images_columns=0):
@@ -0,0 +1,285 @@
+# python imports
+import hashlib
+import json
+
+# django imports
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Q
+
+# permissions imports
+from permissions.models import ObjectPermission
+from permissions.models import ObjectPermissionInheritanceBlock
+from permissions.models import PrincipalRoleRelation
+from permissions.models import Role
+
+# lfc imports
+import lfc.models
+import lfc.utils
+import lfc.utils.tree
+from lfc.managers import get_content_model
+
+# Is increased whenever roles, permissions or the tree are changed. Resolvers
+# which have been created with another version are thrown away.
+_version = 0
+
+
+def get_permission_resolver(user):
+    """Returns the permission resolver of the passed user. The resolver is
+    stored on the user object, hence it lives as long as the current request.
+
+    **Parameters:**
+
+    user
+        The user for which the resolver is returned.
+    """
+    resolver = getattr(user, "_permission_resolver", None)
+    if resolver is None or resolver.version != _version:
+        resolver = PermissionResolver(user)
+        user._permission_resolver = resolver
+    return resolver
+
+
+def get_permission_fingerprint(user):
+    """Returns the permission fingerprint of the passed user, see
+    PermissionResolver.get_fingerprint.
+
+    **Parameters:**
+
+    user
+        The user for which the fingerprint is returned.
+    """
+    return get_permission_resolver(user).get_fingerprint()
+
+
+def invalidate_permission_resolvers(*args, **kwargs):
+    """Invalidates all existing permission resolvers. Is connected to the
+    signals of the django-permissions models (see lfc.listeners).
+    """
+    global _version
+    _version += 1
+
+
+class PermissionResolver(object):
+    """Answers django-permissions' has_permission for many objects of one
+    user. The roles of the user and the object permissions, local roles and
+    inheritance blocks along the ancestors of the objects are loaded in bulk
+    and kept in memory.
+
+    Gives the same results as django-permissions' has_permission plus the
+    LFC specific roles Anonymous and Owner.
+
+    **Parameters:**
+
+    user
+        The user for which permissions are resolved.
+    """
+    def __init__(self, user):
+        self.user = user
+        self.version = _version
+
+        # (content type id, object id) of the object and all its ancestors
+        self.chains = {}
+
+        # (content type id, object id) -> set of role ids
+        self.local_roles = {}
+
+        # (content type id, object id) -> codename -> set of role ids
+        self.permissions = {}
+
+        # (content type id, object id) -> set of codenames
+        self.blocks = {}
+
+        self.anonymous_role_ids = set()
+        self.owner_role_ids = set()
+        for id, name in Role.objects.filter(name__in=("Anonymous", "Owner")).values_list("id", "name"):
+            if name == "Anonymous":
+                self.anonymous_role_ids.add(id)
+            else:
+                self.owner_role_ids.add(id)
+
+        # Global and local roles of the user and his groups. Anonymous users
+        # don't get any of them (see django-permissions' has_permission).
+        self.global_role_ids = set()
+        if not user.is_superuser and not user.is_anonymous():
+            group_ids = list(user.groups.values_list("id", flat=True))
+            relations = PrincipalRoleRelation.objects.filter(Q(user=user) | Q(group__in=group_ids))
+            for content_type_id, content_id, role_id in relations.values_list("content_type", "content_id", "role"):
+                if content_id is None:
+                    self.global_role_ids.add(role_id)
+                else:
+                    self.local_roles.setdefault((content_type_id, content_id), set()).add(role_id)
+
+        self.role_ids = self.anonymous_role_ids | self.owner_role_ids | self.global_role_ids
+        for role_ids in self.local_roles.values():
+            self.role_ids |= role_ids
+
+        self.fingerprint = None
+
+    def get_fingerprint(self):
+        """Returns a hash of everything the permissions of the user depend on.
+        Users with the same fingerprint have the same permissions for every
+        object, hence they can share cache entries which depend on
+        permissions.
+        """
+        if self.fingerprint is not None:
+            return self.fingerprint
+
+        if self.user.is_superuser:
+            self.fingerprint = "superuser"
+        elif self.user.is_anonymous():
+            self.fingerprint = "anonymous"
+        else:
+            local_roles = sorted([(key, sorted(role_ids)) for key, role_ids in self.local_roles.items()])
+            data = [sorted(self.global_role_ids), local_roles]
+
+            # Creators get the Owner role for their objects
+            if self.owner_role_ids and \
+               ObjectPermission.objects.filter(role__in=self.owner_role_ids).exists() and \
+               lfc.models.BaseContent.objects.filter(creator=self.user).exists():
+                data.append(self.user.id)
+
+            self.fingerprint = hashlib.md5(json.dumps(data)).hexdigest()
+
+        return self.fingerprint
+
+    def has_permission(self, obj, codename):
+        """Returns True if the user has the permission with passed codename
+        for passed object.
+
+        **Parameters:**
+
+        obj
+            The content object or portal for which the permission is checked.
+
+        codename
+            The codename of the permission, e.g. "view".
+        """
+        if self.user.is_superuser:
+            return True
+
+        chain = self.get_chain(obj)
+
+        # Every user is also anonymous user
+        roles = set(self.anonymous_role_ids)
+
+        # Check whether the current user is the creator of the object.
+        creator_id = getattr(obj, "creator_id", None)
+        if creator_id is not None and creator_id == self.user.pk:
+            roles |= self.owner_role_ids
+
+        if not self.user.is_anonymous():
+            roles |= self.global_role_ids
+            for key in chain:
+                roles |= self.local_roles.get(key, set())
+
+        for key in chain:
+            if self.permissions.get(key, {}).get(codename, set()) & roles:
+                return True
+            if codename in self.blocks.get(key, ()):
+                return False
+
+        return False
+
+    def get_chain(self, obj):
+        """Returns the keys of passed object and all objects it inherits
+        permissions from, starting with the object itself.
+        """
+        key = self._get_key(obj)
+        if key not in self.chains:
+            self.prefetch([obj])
+        return self.chains[key]
+
+    def prefetch(self, objs):
+        """Loads everything which is needed to check permissions for passed
+        objects. Should be called before permissions of many objects are
+        checked, e.g. for the objects of a listing.
+
+        **Parameters:**
+
+        objs
+            A list of content objects, portals and/or nodes of the content
+            tree (see lfc.utils.tree).
+        """
+        portal = lfc.utils.get_portal()
+        portal_key = self._get_key(portal)
+
+        tree = None
+        content_objs = []
+        for obj in objs:
+            key = self._get_key(obj)
+            if key in self.chains:
+                continue
+            if isinstance(obj, lfc.models.BaseContent) and obj.id:
+                content_objs.append(obj)
+            elif isinstance(obj, lfc.utils.tree.TreeNode):
+                # The ancestors are taken from the snapshot of the tree
+                if tree is None:
+                    tree = lfc.utils.tree.get_tree()
+                ancestors = [self._get_key(node) for node in tree.get_ancestors(obj)]
+                self.chains[key] = [key] + ancestors + [portal_key]
+            elif isinstance(obj, lfc.models.Portal):
+                self.chains[key] = [key]
+            else:
+                # Fall back to the django-permissions way of walking up
+                chain = []
+                while obj is not None:
+                    chain.append(self._get_key(obj))
+                    try:
+                        obj = obj.get_parent_for_permissions()
+                    except AttributeError:
+                        obj = None
+                self.chains[key] = chain
+
+        if content_objs:
+            ancestors = {}
+            relations = lfc.models.ContentTreeRelation.objects.filter(
+                descendant__in=[obj.id for obj in content_objs], depth__gt=0).order_by("depth")
+            for descendant_id, ancestor_id, content_type in relations.values_list("descendant", "ancestor", "ancestor__content_type"):
+                ancestors.setdefault(descendant_id, []).append((self._get_content_type_id(content_type), ancestor_id))
+
+            for obj in content_objs:
+                self.chains[self._get_key(obj)] = [self._get_key(obj)] + ancestors.get(obj.id, []) + [portal_key]
+
+        self._load(objs)
+
+    def _load(self, objs):
+        """Loads the object permissions and inheritance blocks for all
+        objects of the chains of passed objects, which are not loaded yet.
+        """
+        keys = set()
+        for obj in objs:
+            for key in self.chains[self._get_key(obj)]:
+                if key not in self.permissions:
+                    keys.add(key)
+                    self.permissions[key] = {}
+                    self.blocks[key] = set()
+
+        if not keys:
+            return
+
+        content_ids = set([content_id for content_type_id, content_id in keys])
+
+        permissions = ObjectPermission.objects.filter(content_id__in=content_ids, role__in=self.role_ids)
+        for content_type_id, content_id, role_id, codename in permissions.values_list("content_type", "content_id", "role", "permission__codename"):
+            key = (content_type_id, content_id)
+            if key in keys:
+                self.permissions[key].setdefault(codename, set()).add(role_id)
+
+        blocks = ObjectPermissionInheritanceBlock.objects.filter(content_id__in=content_ids)
+        for content_type_id, content_id, codename in blocks.values_list("content_type", "content_id", "permission__codename"):
+            key = (content_type_id, content_id)
+            if key in keys:
+                self.blocks[key].add(codename)
+
+    def _get_key(self, obj):
+        """Returns the key of passed object.
+        """
+        if isinstance(obj, lfc.utils.tree.TreeNode):
+            return (self._get_content_type_id(obj.content_type), obj.id)
+        return (ContentType.objects.get_for_model(obj).id, obj.id)
+
+    def _get_content_type_id(self, content_type):
+        """Returns the id of the Django ContentType of passed LFC content
+        type, e.g. "page".
+        """
+        return ContentType.objects.get_for_model(get_content_model(content_type)).id
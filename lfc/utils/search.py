@@ -0,0 +1,378 @@
+# python imports
+import math
+import re
+import time
+
+# django imports
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models
+from django.db.models import Case
+from django.db.models import F
+from django.db.models import Q
+from django.db.models import Sum
+from django.db.models import Value
+from django.db.models import When
+
+# lfc imports
+import lfc.models
+import lfc.utils
+
+# Terms which are shorter are not indexed
+TERM_MIN_LENGTH = 2
+
+# Terms which are longer are truncated, see SearchIndex.term
+TERM_MAX_LENGTH = 50
+
+# The number of objects which are loaded at once, see get_search_results
+CHUNK_SIZE = 500
+
+# The number of objects which are reindexed at once, see reindex_objects
+REINDEX_BATCH_SIZE = 100
+
+
+def get_search_backend():
+    """Returns the search backend. This is an instance of the class which is
+    configured with LFC_SEARCH_BACKEND. Default is IndexSearchBackend.
+    """
+    path = getattr(settings, "LFC_SEARCH_BACKEND", "lfc.utils.search.IndexSearchBackend")
+    module, klass = path.rsplit(".", 1)
+    return getattr(lfc.utils.import_module(module), klass)()
+
+
+def get_terms(text):
+    """Returns the terms of passed text as dict of term -> frequency.
+
+    **Parameters:**
+
+    text
+        The text to split into terms, e.g. the searchable text of an object.
+    """
+    terms = {}
+    for term in re.findall(r"\w+", (text or "").lower(), re.UNICODE):
+        if len(term) >= TERM_MIN_LENGTH:
+            term = term[:TERM_MAX_LENGTH]
+            terms[term] = terms.get(term, 0) + 1
+    return terms
+
+
+def get_search_results(request, query, language, prefix=False, start=0, limit=None):
+    """Returns the specific content objects which match passed query, ordered
+    by relevance. Only objects which the current user is allowed to view
+    currently are returned.
+
+    The ranked candidates are loaded from the search backend and checked in
+    chunks, starting with the candidate at position start, until limit
+    objects have been found. The ranking and the slicing happen within the
+    backend (for the default backend within the database), hence only the
+    ids of the chunks are loaded, not the ids of all candidates.
+
+    Returns a tuple of the objects, the number of candidates (an upper bound
+    of the number of results) and the position of the candidate with which
+    the next page starts (None if there are no more candidates).
+
+    **Parameters:**
+
+    request
+        The current request.
+
+    query
+        The search query as entered by the user.
+
+    language
+        Only objects with this language or the neutral language are returned.
+
+    prefix
+        If True the last term of the query matches all terms which start with
+        it, e.g. for live search.
+
+    start
+        The position of the first candidate to check, e.g. the next start
+        of the previous page.
+
+    limit
+        The maximal number of returned objects. If None all objects are
+        returned.
+    """
+    backend = get_search_backend()
+    total = backend.count(query, language, prefix)
+
+    if limit is None:
+        chunk_size = CHUNK_SIZE
+    else:
+        chunk_size = min(CHUNK_SIZE, limit * 2)
+
+    results = []
+    position = max(0, start)
+    while position < total:
+        chunk = backend.search(query, language, prefix, start=position, limit=chunk_size)
+        if not chunk:
+            break
+
+        objs = lfc.models.BaseContent.objects.filter(pk__in=chunk).get_content_objects()
+        positions = dict([(id, position + i) for i, id in enumerate(chunk)])
+        objs.sort(key=lambda obj: positions[obj.id])
+        position += len(chunk)
+
+        for obj in lfc.utils.filter_content_objects(request, objs):
+            results.append(obj)
+            if len(results) == limit:
+                next_start = positions[obj.id] + 1
+                if next_start >= total:
+                    next_start = None
+                return results, total, next_start
+
+    return results, total, None
+
+
+def get_reindex_progress():
+    """Returns the progress of the last reindexing (see reindex_objects) as
+    dict with the keys last_id, done, total and finished or None if there
+    hasn't been a reindexing yet or the progress has been evicted.
+    """
+    return cache.get(_get_reindex_key())
+
+
+def reindex_objects(progress=None, seconds=None, batch_size=REINDEX_BATCH_SIZE):
+    """Updates the searchable text and the search index of all content objects
+    in batches ordered by id. The searchable texts are updated with one query
+    per batch, without the side effects of save.
+
+    Returns the progress, which is passed to the next call to resume an
+    interrupted reindexing. The last progress is also cached (see
+    get_reindex_progress), but only to offer the resumption.
+
+    **Parameters:**
+
+    progress
+        The progress of an interrupted reindexing, which is resumed. If None
+        or finished the reindexing starts from the beginning.
+
+    seconds
+        If given the reindexing stops after the batch during which the
+        seconds have passed. Otherwise all objects are reindexed.
+
+    batch_size
+        The number of objects which are reindexed at once.
+    """
+    if progress is None or progress["finished"]:
+        progress = {
+            "last_id": 0,
+            "done": 0,
+            "total": lfc.models.BaseContent.objects.count(),
+            "finished": False,
+        }
+    else:
+        progress = dict(progress)
+
+    backend = get_search_backend()
+    start = time.time()
+
+    while True:
+        ids = list(lfc.models.BaseContent.objects.filter(pk__gt=progress["last_id"]).order_by(
+            "pk").values_list("id", flat=True)[:batch_size])
+
+        if ids:
+            _reindex_batch(backend, ids)
+            progress["last_id"] = ids[-1]
+            progress["done"] += len(ids)
+        else:
+            progress["finished"] = True
+
+        cache.set(_get_reindex_key(), progress, None)
+
+        if progress["finished"] or (seconds is not None and time.time() - start >= seconds):
+            return progress
+
+
+def _reindex_batch(backend, ids):
+    """Reindexes the content objects with passed ids.
+    """
+    objs = lfc.models.BaseContent.objects.filter(pk__in=ids).get_content_objects()
+
+    texts = {}
+    for obj in objs:
+        text = obj.get_searchable_text()
+        if text != obj.searchable_text:
+            texts[obj.id] = text
+            obj.searchable_text = text
+
+    if texts:
+        lfc.models.BaseContent.objects.filter(pk__in=texts.keys()).update(searchable_text=Case(
+            *[When(pk=id, then=Value(text)) for id, text in texts.items()],
+            output_field=models.TextField()))
+
+    backend.index_objects(objs)
+
+
+def _get_reindex_key():
+    """Returns the cache key of the reindexing progress.
+    """
+    return "%s-reindex-progress" % settings.CACHE_MIDDLEWARE_KEY_PREFIX
+
+
+class SearchBackend(object):
+    """Base class of search backends. The backend is informed about every
+    changed content object and returns the ids of the objects which match a
+    query. See LFC_SEARCH_BACKEND.
+    """
+    def index(self, obj):
+        """Adds passed content object to the index or updates it. Objects
+        which are excluded from search are removed from the index.
+        """
+        raise NotImplementedError
+
+    def index_objects(self, objs):
+        """Adds passed content objects to the index or updates them. Backends
+        should overwrite this if they can index many objects at once.
+        """
+        for obj in objs:
+            self.index(obj)
+
+    def unindex(self, obj):
+        """Removes passed content object from the index.
+        """
+        raise NotImplementedError
+
+    def search(self, query, language, prefix=False, start=0, limit=None):
+        """Returns the ids of the content objects which match passed query,
+        ordered by relevance. Only the ids from position start on are
+        returned, at most limit of them (all if limit is None). See
+        get_search_results for the parameters.
+        """
+        raise NotImplementedError
+
+    def count(self, query, language, prefix=False):
+        """Returns the number of content objects which match passed query.
+        Backends should overwrite this if they can count the objects without
+        loading them.
+        """
+        return len(self.search(query, language, prefix))
+
+
+class SimpleSearchBackend(SearchBackend):
+    """Searches the searchable text of the content objects directly. Doesn't
+    need an index, but every search scans the whole table.
+    """
+    def index(self, obj):
+        pass
+
+    def unindex(self, obj):
+        pass
+
+    def search(self, query, language, prefix=False, start=0, limit=None):
+        if not query:
+            return []
+
+        ids = self._get_objects(query, language).order_by("id").values_list("id", flat=True)
+        if limit is None:
+            return list(ids[start:])
+        return list(ids[start:start + limit])
+
+    def count(self, query, language, prefix=False):
+        if not query:
+            return 0
+        return self._get_objects(query, language).count()
+
+    def _get_objects(self, query, language):
+        """Returns the content objects which contain passed query.
+        """
+        return lfc.models.BaseContent.objects.filter(
+            Q(exclude_from_search=False) & Q(language__in=(language, "0")) & Q(searchable_text__icontains=query))
+
+
+class IndexSearchBackend(SearchBackend):
+    """Searches an inverted index of the terms of the searchable text of all
+    content objects (see SearchIndex). All terms of the query have to match.
+    The objects are ranked by the frequencies of the terms within the object,
+    weighted by the rarity of the terms.
+    """
+    def index(self, obj):
+        self.index_objects([obj])
+
+    def index_objects(self, objs):
+        lfc.models.SearchIndex.objects.filter(content__in=[obj.id for obj in objs]).delete()
+
+        entries = []
+        for obj in objs:
+            if not obj.exclude_from_search:
+                for term, frequency in get_terms(obj.searchable_text).items():
+                    entries.append(lfc.models.SearchIndex(
+                        term=term, content_id=obj.id, language=obj.language, frequency=frequency))
+
+        lfc.models.SearchIndex.objects.bulk_create(entries, batch_size=500)
+
+    def unindex(self, obj):
+        lfc.models.SearchIndex.objects.filter(content=obj).delete()
+
+    def search(self, query, language, prefix=False, start=0, limit=None):
+        matches = self._get_matches(query, language, prefix)
+        if matches is None:
+            return []
+
+        matches = matches.order_by("-score", "content")
+        if limit is None:
+            matches = matches[start:]
+        else:
+            matches = matches[start:start + limit]
+
+        return [match["content"] for match in matches]
+
+    def count(self, query, language, prefix=False):
+        matches = self._get_matches(query, language, prefix)
+        if matches is None:
+            return 0
+        return matches.count()
+
+    def _get_matches(self, query, language, prefix):
+        """Returns the index entries which match passed query grouped by
+        content object and annotated with the score, or None if no object can
+        match. The ranking is done by the database, hence the matches can be
+        sliced without loading all of them.
+        """
+        terms = []
+        for term in re.findall(r"\w+", (query or "").lower(), re.UNICODE):
+            term = term[:TERM_MAX_LENGTH]
+            if term not in terms:
+                terms.append(term)
+
+        conditions = []
+        for i, term in enumerate(terms):
+            # Short terms are not indexed, hence they can't restrict the
+            # result.
+            if len(term) < TERM_MIN_LENGTH:
+                continue
+
+            if prefix and i == len(terms) - 1:
+                conditions.append(Q(term__startswith=term))
+            else:
+                conditions.append(Q(term=term))
+
+        if not conditions:
+            return None
+
+        entries = lfc.models.SearchIndex.objects.filter(language__in=(language, "0"))
+        total = lfc.models.BaseContent.objects.count()
+
+        scores = []
+        matched = {}
+        matching = Q()
+        for i, condition in enumerate(conditions):
+            # The weight (idf) of a term needs the number of objects which
+            # contain it. It is scaled to an integer, in order to compute
+            # the scores with integer arithmetic within the database.
+            quantity = entries.filter(condition).values("content").distinct().count()
+            if not quantity:
+                return None
+
+            weight = int(round(1000 * math.log(1.0 + float(total) / quantity)))
+            scores.append(When(condition, then=F("frequency") * weight))
+            matched["matched_%s" % i] = Sum(Case(
+                When(condition, then=Value(1)), default=Value(0), output_field=models.IntegerField()))
+            matching |= condition
+
+        entries = entries.filter(matching).values("content").annotate(
+            score=Sum(Case(*scores, default=Value(0), output_field=models.IntegerField())), **matched)
+
+        # All terms have to match
+        return entries.filter(**dict([("%s__gt" % name, 0) for name in matched]))
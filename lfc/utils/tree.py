@@ -0,0 +1,233 @@
+# python imports
+import datetime
+
+# django imports
+from django.conf import settings
+from django.core.urlresolvers import get_script_prefix
+from django.core.urlresolvers import reverse
+from django.utils import translation
+
+# lfc imports
+import lfc.models
+import lfc.utils
+import lfc.utils.resolver
+
+# The snapshot of the current process, see get_tree
+_tree = None
+
+
+def get_tree():
+    """Returns the snapshot of the content tree. The snapshot is loaded once
+    per process and is reloaded as soon as the navigation has been changed
+    within any process (see BaseContent.save).
+    """
+    global _tree
+
+    # The version is taken before the tree is loaded, hence changes which
+    # happen while loading lead to another reload.
+    version = lfc.utils.get_cache_key("tree", names=["navigation"])
+
+    tree = _tree
+    if tree is None or tree.version != version:
+        tree = Tree(version)
+        _tree = tree
+
+    return tree
+
+
+def filter_nodes(request, nodes):
+    """Returns the passed nodes which are registered and (if the request is
+    passed) which the current user is allowed to view currently. This is the
+    equivalent of lfc.utils.filter_content_objects.
+
+    **Parameters:**
+
+    request
+        The current request or None.
+
+    nodes
+        The nodes to filter.
+    """
+    infos = {}
+    for node in nodes:
+        if node.content_type not in infos:
+            infos[node.content_type] = lfc.utils.registration.get_info(node.content_type)
+
+    nodes = [node for node in nodes if infos[node.content_type]]
+    if request is None or request.user.is_superuser:
+        return nodes
+
+    resolver = lfc.utils.resolver.get_permission_resolver(request.user)
+    resolver.prefetch(nodes)
+
+    return [node for node in nodes
+            if resolver.has_permission(node, "view") and node.is_active(request.user)]
+
+
+class Tree(object):
+    """An in-memory snapshot of all content objects with the fields which are
+    needed to display navigations, tabs and breadcrumbs (see TreeNode).
+
+    The snapshot mustn't be changed, as it is shared by all requests of the
+    process.
+
+    **Parameters:**
+
+    version
+        The version of the content tree, see get_tree.
+    """
+    __slots__ = ("version", "nodes", "children")
+
+    def __init__(self, version):
+        self.version = version
+
+        # id -> node
+        self.nodes = {}
+
+        # parent id (None for the top level) -> tuple of ordered nodes
+        self.children = {}
+
+        children = {}
+        objs = lfc.models.BaseContent.objects.order_by("position", "id").values_list(*TreeNode.query_fields)
+        for values in objs:
+            node = TreeNode(*values)
+            self.nodes[node.id] = node
+            children.setdefault(node.parent_id, []).append(node)
+
+        for parent_id, nodes in children.items():
+            parent = self.nodes.get(parent_id)
+            order_by = parent and parent.order_by or "position"
+            if order_by.lstrip("-") != "position":
+                name = order_by.lstrip("-")
+                nodes.sort(key=lambda node: (getattr(node, name) is not None, getattr(node, name)))
+            if order_by.startswith("-"):
+                nodes.reverse()
+            self.children[parent_id] = tuple(nodes)
+
+        for node in self.nodes.values():
+            if not node.url:
+                node.url = self._get_url_parts(node)
+
+    def get_node(self, id):
+        """Returns the node with passed id or None.
+        """
+        return self.nodes.get(id)
+
+    def get_children(self, node=None):
+        """Returns the ordered children of passed node. If no node is passed
+        the top level nodes are returned.
+        """
+        return self.children.get(node and node.id, ())
+
+    def get_ancestors(self, node):
+        """Returns all ancestors of passed node, starting with the parent.
+        """
+        ancestors = []
+        node = self.nodes.get(node.parent_id)
+        while node is not None:
+            ancestors.append(node)
+            node = self.nodes.get(node.parent_id)
+        return ancestors
+
+    def _get_url_parts(self, node):
+        """Returns the slug path and the language of the URL of passed node,
+        which hasn't stored its URL. The language is None if the URL depends
+        on the current language. See BaseContent.get_absolute_url.
+        """
+        page = self.nodes.get(node.standard_id) or node
+
+        slugs = [page.slug] + [ancestor.slug for ancestor in self.get_ancestors(page)]
+        slugs.reverse()
+        slug = "/".join(slugs)
+
+        if page.language != "0":
+            language = page.language
+        elif page.parent_id:
+            language = self.nodes[page.parent_id].language
+        else:
+            language = None
+
+        return (slug, language)
+
+
+class TreeNode(object):
+    """A content object within the snapshot of the content tree.
+
+    The slots are kept small, so that even big trees fit into memory. The URL
+    is the stored URL of the object (without the script prefix) or a tuple of
+    slug path and language if it isn't stored, see Tree.
+    """
+    __slots__ = ("id", "parent_id", "content_type", "slug", "title", "position",
+                 "publication_date", "language", "exclude_from_navigation",
+                 "start_date", "end_date", "order_by", "standard_id",
+                 "creator_id", "url")
+
+    # The fields which are loaded from BaseContent in the order of the slots.
+    query_fields = ("id", "parent", "content_type", "slug", "title", "position",
+                    "publication_date", "language", "exclude_from_navigation",
+                    "start_date", "end_date", "order_by", "standard", "creator",
+                    "absolute_url")
+
+    def __init__(self, id, parent_id, content_type, slug, title, position,
+                 publication_date, language, exclude_from_navigation,
+                 start_date, end_date, order_by, standard_id, creator_id, url):
+        self.id = id
+        self.parent_id = parent_id
+        self.content_type = content_type
+        self.slug = slug
+        self.title = title
+        self.position = position
+        self.publication_date = publication_date
+        self.language = language
+        self.exclude_from_navigation = exclude_from_navigation
+        self.start_date = start_date
+        self.end_date = end_date
+        self.order_by = order_by
+        self.standard_id = standard_id
+        self.creator_id = creator_id
+        self.url = url
+
+    def __repr__(self):
+        return "<TreeNode %s: %s>" % (self.id, self.slug)
+
+    def get_absolute_url(self):
+        """Returns the absolute URL of the node. See
+        BaseContent.get_absolute_url.
+        """
+        if not isinstance(self.url, tuple):
+            return get_script_prefix() + self.url
+
+        slug, language = self.url
+        if language is None:
+            language = translation.get_language()
+
+        if language in ("0", settings.LANGUAGE_CODE):
+            return reverse("lfc_base_view", kwargs={"slug": slug})
+        else:
+            return reverse("lfc_base_view", kwargs={"slug": slug, "language": language})
+
+    def get_content_object(self):
+        """Returns the content object of the node.
+        """
+        return lfc.utils.get_content_object(pk=self.id)
+
+    def has_permission(self, user, codename):
+        """Returns True if passed user has the permission with passed codename
+        for the node.
+        """
+        return lfc.utils.resolver.get_permission_resolver(user).has_permission(self, codename)
+
+    def is_active(self, user):
+        """Returns True if now is between start and end date of the node. See
+        BaseContent.is_active.
+        """
+        if user.is_superuser:
+            return True
+
+        now = datetime.datetime.now()
+        if self.start_date and self.start_date > now:
+            return False
+        if self.end_date and now >= self.end_date:
+            return False
+
+        return True
@@ -1,28 +1,47 @@
 # python imports
+import datetime
+import hashlib
+import json
 import logging
+import mimetypes
 import sys
+import time
 import traceback
 
 # django imports
 from django.conf import settings
+from django.core.cache import cache
 from django.core.mail import EmailMessage
 from django.core.urlresolvers import reverse
-from django.db.models import Q
 from django.http import Http404
 from django.http import HttpResponse
+from django.http import HttpResponseNotModified
 from django.http import HttpResponseRedirect
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.shortcuts import render_to_response
 from django.template import RequestContext
 from django.utils import translation
+from django.utils.cache import patch_cache_control
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date
+from django.utils.http import parse_etags
+from django.utils.http import parse_http_date_safe
+from django.utils.http import quote_etag
 from django.utils.translation import ugettext_lazy as _
 
 # lfc imports
 import lfc.utils
+from lfc.fields.thumbs import get_thumb_name
+from lfc.fields.thumbs import set_thumb_stored
 from lfc.models import File
 from lfc.models import BaseContent
+from lfc.models import Image
 from lfc.models import Portal
+from lfc.settings import IMAGE_SIZES
 from lfc.settings import LFC_LANGUAGE_IDS
+from lfc.utils.resolver import get_permission_fingerprint
+from lfc.utils.search import get_search_results
 
 # tagging imports
 from tagging.models import TaggedItem
@@ -31,6 +50,9 @@ from tagging.utils import get_tag
 # Load logger
 logger = logging.getLogger(__name__)
 
+# The number of bytes which are read at once, see file
+FILE_CHUNK_SIZE = 64 * 1024
+
 
 def portal(request, template_name="lfc/portal.html"):
     """
@@ -51,6 +73,19 @@ def base_view(request, language=None, slug=None, obj=None):
     else:
         translation.activate(settings.LANGUAGE_CODE)
 
+    # CACHE. Anonymous users get the rendered page without touching the
+    # database.
+    page_cache_key = _get_page_cache_key(request, slug)
+    if page_cache_key:
+        page = cache.get(page_cache_key)
+        if page is not None:
+            result, validators = page
+            response = _get_not_modified_response(request, validators)
+            if response is None:
+                response = HttpResponse(result)
+                _set_validators(request, response, validators)
+            return response
+
     if slug:
         obj = lfc.utils.traverse_object(request, slug)
     else:
@@ -95,21 +130,329 @@ def base_view(request, language=None, slug=None, obj=None):
         url = obj.get_absolute_url()
         return HttpResponseRedirect(url)
 
+    # Conditional GET
+    validators = _get_page_validators(request, obj, slug)
+    response = _get_not_modified_response(request, validators)
+    if response is not None:
+        return response
+
     obj.set_context(request)
     result = obj.render(request)
-    return HttpResponse(result)
+
+    # Pages with a CSRF token are specific to the visitor.
+    if page_cache_key and not request.META.get("CSRF_COOKIE_USED"):
+        cache.set(page_cache_key, (result, validators), _get_page_cache_timeout(obj))
+
+    response = HttpResponse(result)
+    _set_validators(request, response, validators)
+    return response
+
+
+def _get_page_cache_key(request, slug):
+    """Returns the key of the page cache for the current request or None if
+    the page mustn't be cached, see LFC_ANONYMOUS_PAGE_CACHE.
+
+    The page depends on the object and its ancestors (all included by the
+    slug), the portlets (which invalidate the subtree of the object they are
+    assigned to), the navigation and, if there is no slug, on the standard
+    object of the portal.
+    """
+    if not getattr(settings, "LFC_ANONYMOUS_PAGE_CACHE", False):
+        return None
+
+    if request.method != "GET" or request.GET or "message" in request.COOKIES or \
+       not request.user.is_anonymous():
+        return None
+
+    if slug:
+        parts = slug.split("/")
+        dependencies = ["/".join(parts[:i + 1]) for i in range(len(parts))]
+        names = ["navigation"]
+    else:
+        dependencies = []
+        names = ["navigation", "standard"]
+
+    return lfc.utils.get_cache_key("page-%s-%s" % (translation.get_language(), slug or ""),
+                                   dependencies, names)
+
+
+def _get_page_cache_timeout(obj):
+    """Returns the timeout of the cached page of passed object. The page
+    mustn't be cached beyond the end date of the object.
+    """
+    timeout = getattr(settings, "LFC_ANONYMOUS_PAGE_CACHE_TIMEOUT", 300)
+    if obj.end_date:
+        seconds = int((obj.end_date - datetime.datetime.now()).total_seconds())
+        timeout = max(1, min(timeout, seconds))
+
+    return timeout
+
+
+def _get_page_validators(request, obj, slug):
+    """Returns the ETag, the time of the last modification (as timestamp) and
+    the max age of the page of passed object as dict or None if the page
+    must always be rendered. The page depends on the user, which only the
+    ETag reflects (see _get_not_modified_response).
+
+    Like the page cache (see _get_page_cache_key) the validators change if
+    the object, one of its ancestors, its portlets, the navigation or the
+    registrations (including the templates) are changed or if a start or end
+    date of any object has passed (which might change the navigation).
+    """
+    # Messages are only displayed once.
+    if "message" in request.COOKIES:
+        return None
+
+    names = ["navigation", "registrations"]
+    if not slug:
+        names.append("standard")
+
+    last_date, next_date = lfc.utils.get_active_dates()
+
+    last_modified = max(lfc.utils.get_cache_modified([obj], names),
+                        time.mktime(obj.modification_date.timetuple()))
+    if last_date:
+        last_modified = max(last_modified, time.mktime(last_date.timetuple()))
+
+    etag = hashlib.md5(json.dumps([
+        lfc.utils.get_cache_key("page", [obj], names),
+        get_permission_fingerprint(request.user),
+        request.user.pk,
+        translation.get_language(),
+        str(obj.modification_date),
+        str(last_date),
+    ])).hexdigest()
+
+    max_age = getattr(settings, "LFC_PAGE_MAX_AGE", 0)
+    if next_date:
+        seconds = int((next_date - datetime.datetime.now()).total_seconds())
+        max_age = max(0, min(max_age, seconds))
+
+    return {
+        "etag": etag,
+        "last_modified": int(last_modified),
+        "max_age": max_age,
+        "personalized": True,
+    }
+
+
+def _get_not_modified_response(request, validators):
+    """Returns a 304 response if the client's version of the page is still
+    valid (see RFC 7232) or None if the page has to be sent.
+
+    The time of the last modification doesn't change if another user logs
+    in, hence If-Modified-Since alone is only used for anonymous users if the
+    validators are personalized. Otherwise the ETag is required.
+    """
+    if validators is None or request.method not in ("GET", "HEAD"):
+        return None
+
+    if_none_match = request.META.get("HTTP_IF_NONE_MATCH")
+    if_modified_since = request.META.get("HTTP_IF_MODIFIED_SINCE")
+
+    # If-None-Match takes precedence over If-Modified-Since
+    if if_none_match:
+        etags = parse_etags(if_none_match)
+        not_modified = "*" in etags or validators["etag"] in etags
+    elif if_modified_since and (request.user.is_anonymous() or not validators.get("personalized")):
+        if_modified_since = parse_http_date_safe(if_modified_since)
+        not_modified = if_modified_since is not None and validators["last_modified"] <= if_modified_since
+    else:
+        not_modified = False
+
+    if not not_modified:
+        return None
+
+    response = HttpResponseNotModified()
+    _set_validators(request, response, validators)
+    return response
+
+
+def _set_validators(request, response, validators):
+    """Sets the ETag, Last-Modified and Cache-Control headers of passed
+    response. Only pages for anonymous users without a CSRF token might be
+    cached by shared caches, all other pages have to be revalidated by the
+    browser on every request.
+    """
+    if validators is None:
+        return
+
+    response["ETag"] = quote_etag(validators["etag"])
+    response["Last-Modified"] = http_date(validators["last_modified"])
+
+    if request.user.is_anonymous() and not request.META.get("CSRF_COOKIE_USED"):
+        patch_cache_control(response, public=True, max_age=validators["max_age"], must_revalidate=True)
+    else:
+        patch_cache_control(response, private=True, max_age=0, must_revalidate=True)
+
+    # The version for anonymous users mustn't be used after a login
+    if validators.get("personalized"):
+        patch_vary_headers(response, ["Cookie"])
 
 
 def file(request, language=None, id=None):
     """Delivers files to the browser.
+
+    The file is streamed in chunks. Single byte ranges (RFC 7233) are
+    supported, e.g. to resume downloads or to seek within videos. If
+    LFC_FILE_SENDFILE is set, the file is delivered by the front-end server.
     """
     file = get_object_or_404(File, pk=id)
-    response = HttpResponse(file.file, content_type='application/binary')
+
+    try:
+        size = file.file.size
+    except (IOError, OSError):
+        raise Http404
+
+    validators = _get_file_validators(file, size)
+    response = _get_not_modified_response(request, validators)
+    if response is not None:
+        return response
+
+    content_type = mimetypes.guess_type(file.file.name)[0] or "application/binary"
+    sendfile = getattr(settings, "LFC_FILE_SENDFILE", None)
+
+    if sendfile:
+        # The front-end server handles ranges by itself.
+        response = HttpResponse(content_type=content_type)
+        if sendfile.lower() == "x-accel-redirect":
+            url = getattr(settings, "LFC_FILE_ACCEL_REDIRECT_URL", "/lfc-files/")
+            response["X-Accel-Redirect"] = url + file.file.name
+        else:
+            response["X-Sendfile"] = file.file.path
+    else:
+        start, end = 0, size - 1
+        byte_range = _get_byte_range(request, validators, size)
+        if byte_range == "unsatisfiable":
+            response = HttpResponse(status=416)
+            response["Content-Range"] = "bytes */%s" % size
+            return response
+
+        if byte_range is None:
+            status = 200
+        else:
+            status = 206
+            start, end = byte_range
+
+        fh = file.file.storage.open(file.file.name, "rb")
+        response = StreamingHttpResponse(_read_file(fh, start, end - start + 1), status=status, content_type=content_type)
+        response["Content-Length"] = end - start + 1
+        response["Accept-Ranges"] = "bytes"
+        if status == 206:
+            response["Content-Range"] = "bytes %s-%s/%s" % (start, end, size)
+
     response['Content-Disposition'] = 'attachment; filename=%s' % file.title
+    _set_validators(request, response, validators)
 
     return response
 
 
+def _get_file_validators(file, size):
+    """Returns the ETag, the time of the last modification (as timestamp)
+    and the max age of passed file as dict, see _get_page_validators.
+    """
+    last_modified = time.mktime(file.creation_date.timetuple())
+    etag = hashlib.md5(json.dumps([file.file.name, size, str(file.creation_date)])).hexdigest()
+
+    return {
+        "etag": etag,
+        "last_modified": int(last_modified),
+        "max_age": 0,
+    }
+
+
+def _get_byte_range(request, validators, size):
+    """Returns the requested byte range of a file with passed size as tuple
+    of first and last position, None if the whole file has to be sent or
+    "unsatisfiable" if the range doesn't overlap the file.
+
+    Multiple ranges aren't supported, in this case the whole file is sent
+    (see RFC 7233, 3.1).
+    """
+    header = request.META.get("HTTP_RANGE", "").strip()
+    if request.method != "GET" or not header.startswith("bytes="):
+        return None
+
+    # The range is only valid for the version of the client (If-Range). Weak
+    # ETags never match, as If-Range requires the strong comparison.
+    if_range = request.META.get("HTTP_IF_RANGE")
+    if if_range:
+        if if_range.startswith("W/"):
+            return None
+        elif if_range.startswith("\""):
+            if parse_etags(if_range) != [validators["etag"]]:
+                return None
+        elif parse_http_date_safe(if_range) != validators["last_modified"]:
+            return None
+
+    ranges = header[len("bytes="):].split(",")
+    if len(ranges) != 1 or "-" not in ranges[0]:
+        return None
+
+    first, last = [part.strip() for part in ranges[0].split("-", 1)]
+    try:
+        if first:
+            first = int(first)
+            last = int(last) if last else size - 1
+        else:
+            # Suffix range, e.g. the last 500 bytes. An empty suffix can't be
+            # satisfied (see RFC 7233, 2.1).
+            length = int(last)
+            if length == 0:
+                return "unsatisfiable"
+            first = max(0, size - length)
+            last = size - 1
+    except ValueError:
+        return None
+
+    if last < first:
+        return None
+
+    if first >= size:
+        return "unsatisfiable"
+
+    return (first, min(last, size - 1))
+
+
+def _read_file(fh, start, length):
+    """Yields passed length of bytes of passed file in chunks, starting at
+    passed position. The file is closed afterwards.
+    """
+    try:
+        fh.seek(start)
+        while length > 0:
+            data = fh.read(min(FILE_CHUNK_SIZE, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+    finally:
+        fh.close()
+
+
+def thumbnail(request, width, height, name):
+    """Generates the thumbnail with passed size of the image with passed name
+    if it doesn't exist yet and redirects to it. See LFC_LAZY_THUMBNAILS.
+    """
+    size = (int(width), int(height))
+    if size not in IMAGE_SIZES:
+        raise Http404
+
+    image = Image.objects.filter(image=name).first()
+    if image is None:
+        raise Http404
+
+    thumb_name = get_thumb_name(image.image.name, size)
+    if not image.image.storage.exists(thumb_name):
+        image.image.generate_thumbs([size], missing=True)
+        image.image.close()
+
+    # From now on the thumbnail is served statically, see get_thumb_url
+    set_thumb_stored(image.image.name, size)
+
+    return HttpResponseRedirect(image.image.storage.url(thumb_name))
+
+
 def live_search_results(request, language=None, template_name="lfc/live_search_results.html"):
     """Displays the live search result for passed language and query.
     """
@@ -118,24 +461,19 @@ def live_search_results(request, language=None, template_name="lfc/live_search_r
     if language is None:
         language = settings.LANGUAGE_CODE
 
-    f = Q(exclude_from_search=False) & \
-        (Q(language=language) | Q(language="0")) & \
-        (Q(searchable_text__icontains=query))
-
     try:
         obj = BaseContent.objects.get(slug="search-results")
     except BaseContent.DoesNotExist:
         obj = None
 
-    results = lfc.utils.get_content_objects(request, f)
-    quantity = len(results)
+    results, quantity, next_start = get_search_results(request, query, language, prefix=True, limit=20)
 
     return render_to_response(template_name, RequestContext(request, {
         "lfc_context": obj,
         "query": query,
-        "results": results[:20],
+        "results": results,
         "quantity": quantity,
-        "see_all": quantity > 20,
+        "see_all": next_start is not None,
     }))
 
 
@@ -147,21 +485,29 @@ def search_results(request, language=None, template_name="lfc/search_results.htm
     if language is None:
         language = settings.LANGUAGE_CODE
 
-    f = Q(exclude_from_search=False) & \
-        (Q(language=language) | Q(language="0")) & \
-        (Q(searchable_text__icontains=query))
-
     try:
         obj = BaseContent.objects.get(slug="search-results")
     except BaseContent.DoesNotExist:
         obj = None
 
-    results = lfc.utils.get_content_objects(request, f)
+    try:
+        start = int(request.GET.get("start", 0))
+    except ValueError:
+        start = 0
+
+    # All results are displayed at once, unless paging is configured
+    limit = getattr(settings, "LFC_SEARCH_RESULTS_PER_PAGE", None)
+    results, quantity, next_start = get_search_results(request, query, language, start=start, limit=limit)
+    if limit is None:
+        quantity = len(results)
 
     return render_to_response(template_name, RequestContext(request, {
         "lfc_context": obj,
         "query": query,
         "results": results,
+        "quantity": quantity,
+        "start": start,
+        "next_start": next_start,
     }))
 
 